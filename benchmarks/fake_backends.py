@@ -0,0 +1,127 @@
+import random
+import time
+from concurrent import futures
+
+import auth_service.authservice_pb2 as auth_pb2
+import election_service.election_grpc_pb2 as election_pb2
+import grpc
+import storage.storage_service_pb2 as storage_pb2
+import user_service.user_service_pb2 as user_pb2
+from google.protobuf import message_factory
+from google.protobuf.descriptor import FieldDescriptor
+
+# env prefix -> (pb2 module, service name), the same backends controller/__init__.py talks to
+SERVICES = {
+    "AUTH": (auth_pb2, "AuthService"),
+    "USER": (user_pb2, "UserService"),
+    "ELECTION": (election_pb2, "ElectionService"),
+    "STORAGE": (storage_pb2, "StorageService"),
+}
+
+# Values for well-known field names, everything else gets a type default
+CANNED = {
+    "status": 0,
+    "description": "OK",
+    "login": "capybara",
+    "nickname": "capybara",
+    "first_name": "Capy",
+    "last_name": "Bara",
+    "avatar": "avatar.webp",
+    "about": "Capybara for president " * 10,
+    "uuid": "00000000-0000-0000-0000-000000000000",
+}
+
+SCALAR_DEFAULTS = {
+    FieldDescriptor.CPPTYPE_STRING: "fake",
+    FieldDescriptor.CPPTYPE_INT32: 7,
+    FieldDescriptor.CPPTYPE_INT64: 7,
+    FieldDescriptor.CPPTYPE_UINT32: 7,
+    FieldDescriptor.CPPTYPE_UINT64: 7,
+    FieldDescriptor.CPPTYPE_DOUBLE: 12.5,
+    FieldDescriptor.CPPTYPE_FLOAT: 12.5,
+    FieldDescriptor.CPPTYPE_BOOL: False,
+}
+
+
+def fake_message(descriptor, list_size, depth=0):
+    message = message_factory.GetMessageClass(descriptor)()
+    for field in descriptor.fields:
+        if field.cpp_type == FieldDescriptor.CPPTYPE_MESSAGE:
+            if depth > 2:
+                continue
+            if field.label == FieldDescriptor.LABEL_REPEATED:
+                for _ in range(list_size):
+                    getattr(message, field.name).add().CopyFrom(
+                        fake_message(field.message_type, list_size, depth + 1))
+            else:
+                getattr(message, field.name).CopyFrom(fake_message(field.message_type, list_size, depth + 1))
+        elif field.cpp_type == FieldDescriptor.CPPTYPE_ENUM:
+            continue
+        else:
+            value = CANNED.get(field.name, SCALAR_DEFAULTS[field.cpp_type])
+            if field.type == FieldDescriptor.TYPE_BYTES:
+                value = b"fake"
+            elif field.cpp_type != FieldDescriptor.CPPTYPE_STRING and isinstance(value, str):
+                value = SCALAR_DEFAULTS[field.cpp_type]
+            if field.label == FieldDescriptor.LABEL_REPEATED:
+                getattr(message, field.name).extend([value] * list_size)
+            else:
+                setattr(message, field.name, value)
+    return message
+
+
+class FakeBackend:
+    """Answers every method of one service with a canned response after
+    ``latency`` (+/- ``jitter``) seconds, failing ``error_rate`` of calls."""
+
+    def __init__(self, name, latency=0.005, jitter=0.0, error_rate=0.0, list_size=20):
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.list_size = list_size
+        self.calls = 0
+        pb2, service_name = SERVICES[name]
+        self.service = pb2.DESCRIPTOR.services_by_name[service_name]
+
+    def _respond(self, method, context):
+        self.calls += 1
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        if random.random() < self.error_rate:
+            context.abort(grpc.StatusCode.UNAVAILABLE, "injected error")
+        return fake_message(method.output_type, self.list_size)
+
+    def handler(self):
+        handlers = {}
+        for method in self.service.methods:
+            request_class = message_factory.GetMessageClass(method.input_type)
+            response_class = message_factory.GetMessageClass(method.output_type)
+            if method.client_streaming and not method.server_streaming:
+                def behaviour(request_iterator, context, method=method):
+                    for _ in request_iterator:
+                        pass
+                    return self._respond(method, context)
+                rpc_handler = grpc.stream_unary_rpc_method_handler
+            elif not method.client_streaming and not method.server_streaming:
+                def behaviour(request, context, method=method):
+                    return self._respond(method, context)
+                rpc_handler = grpc.unary_unary_rpc_method_handler
+            else:
+                continue
+            handlers[method.name] = rpc_handler(behaviour,
+                                                request_deserializer=request_class.FromString,
+                                                response_serializer=response_class.SerializeToString)
+        return grpc.method_handlers_generic_handler(self.service.full_name, handlers)
+
+
+def start_fake_backends(backends, workers=64):
+    """Serves every backend on its own localhost port. Returns the running
+    servers and {name: port} to put into <NAME>_SERVICE_HOST/PORT."""
+    servers, ports = [], {}
+    for backend in backends:
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=workers))
+        server.add_generic_rpc_handlers((backend.handler(),))
+        ports[backend.name] = server.add_insecure_port("127.0.0.1:0")
+        server.start()
+        servers.append(server)
+    return servers, ports
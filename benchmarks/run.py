@@ -0,0 +1,166 @@
+"""Latency benchmark of the gateway against in-process fake backends.
+
+    python -m benchmarks.run --rps 200 --duration 10 --latency USER=0.02
+    python -m benchmarks.run --compare benchmarks/results/<previous>.json
+
+Every endpoint is driven open-loop at the target rate, latency is measured
+from the moment a request was due, so queueing inside the gateway counts.
+"""
+import argparse
+import json
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from benchmarks.fake_backends import SERVICES, FakeBackend, start_fake_backends
+
+ENDPOINTS = {
+    "get_user_data": ("GET", "/api/get_user_data"),
+    "check_election": ("GET", "/api/check_election"),
+    "candidates": ("GET", "/api/candidates"),
+    "vote_statistic": ("GET", "/api/vote_statistic"),
+    "my_voice": ("GET", "/api/my_voice"),
+    "check_register": ("GET", "/api/check_register"),
+    "peer_info": ("GET", "/api/peer_info?nickname=capybara"),
+    "get_friend_stats": ("GET", "/api/get_friend_stats"),
+    "search_user": ("GET", "/api/search_user?nickname=capy"),
+    "check_signin": ("GET", "/auth/check_signin"),
+}
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def parse_per_service(values, default):
+    config = {name: default for name in SERVICES}
+    for value in values or []:
+        name, number = value.split("=")
+        config[name.upper()] = float(number)
+    return config
+
+
+# A short run at a low rate may not have sent a single request
+def percentile(samples, fraction):
+    if not samples:
+        return 0
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+class Driver:
+    def __init__(self, app, concurrency):
+        self.app = app
+        self.local = threading.local()
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    def client(self):
+        if not hasattr(self.local, "client"):
+            self.local.client = self.app.test_client()
+            self.local.client.set_cookie("capy-uuid", "bench-uuid")
+        return self.local.client
+
+    def request(self, method, path, due, samples, errors):
+        response = self.client().open(path, method=method)
+        latency = time.perf_counter() - due
+        if response.status_code >= 400:
+            errors.append(response.status_code)
+        samples.append(latency)
+
+    def run(self, method, path, rps, duration):
+        samples, errors, futures = [], [], []
+        total = int(rps * duration)
+        start = time.perf_counter()
+        for i in range(total):
+            due = start + i / rps
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(self.executor.submit(self.request, method, path, due, samples, errors))
+        for future in futures:
+            future.result()
+        elapsed = time.perf_counter() - start
+        samples.sort()
+        return {
+            "requests": total,
+            "errors": len(errors),
+            "throughput": round(len(samples) / elapsed, 1),
+            "p50_ms": round(percentile(samples, 0.50) * 1000, 2),
+            "p90_ms": round(percentile(samples, 0.90) * 1000, 2),
+            "p99_ms": round(percentile(samples, 0.99) * 1000, 2),
+            "max_ms": round(percentile(samples, 1) * 1000, 2),
+        }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    print(f"{'endpoint':<18}{'rps':>9}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, result in results.items():
+        line = f"{name:<18}{result['throughput']:>9}{result['p50_ms']:>10}{result['p99_ms']:>10}{result['errors']:>8}"
+        previous = (baseline or {}).get(name)
+        if previous:
+            line += (f"   p50 {result['p50_ms'] - previous['p50_ms']:+.2f}"
+                     f"  p99 {result['p99_ms'] - previous['p99_ms']:+.2f}")
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", nargs="+", default=list(ENDPOINTS), choices=list(ENDPOINTS))
+    parser.add_argument("--rps", type=float, default=100)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--latency", nargs="*", help="backend latency in seconds, e.g. USER=0.02")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", nargs="*", help="share of failing calls, e.g. ELECTION=0.05")
+    parser.add_argument("--list-size", type=int, default=20, help="items in repeated response fields")
+    parser.add_argument("--output", default=RESULTS_DIR)
+    parser.add_argument("--compare", help="previous results file to diff against")
+    args = parser.parse_args()
+
+    latency = parse_per_service(args.latency, 0.005)
+    error_rate = parse_per_service(args.error_rate, 0.0)
+    backends = [FakeBackend(name, latency[name], args.jitter, error_rate[name], args.list_size)
+                for name in SERVICES]
+    servers, ports = start_fake_backends(backends)
+    for name, port in ports.items():
+        os.environ[f"{name}_SERVICE_HOST"] = "127.0.0.1"
+        os.environ[f"{name}_SERVICE_PORT"] = str(port)
+
+    # Imported only now, the gateway reads backend addresses from the environment
+    from controller import app
+
+    driver = Driver(app, args.concurrency)
+    results = {}
+    for name in args.endpoints:
+        method, path = ENDPOINTS[name]
+        results[name] = driver.run(method, path, args.rps, args.duration)
+    for server in servers:
+        server.stop(None)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)["results"]
+    print_results(results, baseline)
+
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(path, "w") as file:
+        json.dump({
+            "revision": git_revision(),
+            "config": vars(args),
+            "backend_calls": {backend.name: backend.calls for backend in backends},
+            "results": results,
+        }, file, indent=2)
+    print(f"Saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
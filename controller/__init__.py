@@ -9,32 +9,113 @@ from dotenv import load_dotenv
 from flasgger import Swagger
 from flask import Flask
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 load_dotenv()
+
+from controller.bulkhead import Bulkhead, BulkheadInterceptor
+from controller.cache import TTLCache, UserCache
+from controller.channels import PooledStub, in_flight
+from controller.compression import init_compression
+from controller.interceptors import (CircuitBreakerInterceptor,
+                                     CoalescingInterceptor,
+                                     DeadlineInterceptor, RetryBudget,
+                                     RetryInterceptor)
+from controller.logs import init_logging
+from controller.metrics import CacheMetrics, MetricsInterceptor, init_metrics
+from controller.serialization import init_json
+from controller.tracing import TracingInterceptor, init_tracing
+from controller.utils import FAN_OUT_WORKERS, backend_error
+
 CORS_ORIGIN = [
     "*"
 ]
 
 app = Flask(__name__)
+init_logging(app)
+init_tracing(app)
 CORS(app, supports_credentials=True, origins=CORS_ORIGIN)
 Swagger(app)
+init_metrics(app)
+init_json(app)
+init_compression(app)
+app.register_error_handler(grpc.RpcError, backend_error)
+
+# Number of reverse proxies in front of gunicorn whose X-Forwarded-For and
+# X-Forwarded-Proto are trusted. remote_addr then is the real client, which
+# rate limits and logs are keyed by. Set it to 0 when clients reach gunicorn
+# directly, otherwise they can pick their own address.
+PROXY_FIX_HOPS = int(os.getenv("PROXY_FIX_HOPS", 1))
+if PROXY_FIX_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_FIX_HOPS, x_proto=PROXY_FIX_HOPS)
+
+# Read-only calls whose identical in-flight requests can share one response
+READ_METHODS = {
+    "get_rp", "get_avatar", "get_peer_info", "get_friend_stats", "search_user",
+    "GetElection", "GetCandidates", "GetStatistic",
+    "CheckCandidateTmp", "CheckCandidateCapy", "MyCandidatesTmp", "MyCandidatesCapy",
+}
+
+
+# GRPC_TIMEOUTS overrides the default deadline per method, e.g. "Put=30,GetStatistic=1"
+GRPC_TIMEOUTS = {
+    method: float(timeout)
+    for method, timeout in (item.split("=") for item in os.getenv("GRPC_TIMEOUTS", "Put=30").split(",") if item)
+}
+
+retry_budget = RetryBudget(ratio=float(os.getenv("GRPC_RETRY_RATIO", 0.1)),
+                           max_tokens=float(os.getenv("GRPC_RETRY_MAX_TOKENS", 10)))
+
+
+# <NAME>_MAX_CONCURRENCY, <NAME>_MAX_QUEUE and <NAME>_QUEUE_TIMEOUT size one
+# backend's bulkhead, the GRPC_* variables all of them
+def service_setting(name, key, default):
+    return os.getenv(f"{name}_{key}", os.getenv(f"GRPC_{key}", default))
+
+
+def service_bulkhead(name):
+    # Backends are called from request threads and the fan-out pool. Each
+    # backend gets half of them, so a slow one always leaves threads for the
+    # others; uploads are slow and few, storage gets half of the request
+    # threads. A full bulkhead fails fast unless a queue is configured.
+    threads = int(os.getenv("GUNICORN_THREADS", 8))
+    default = threads // 2 if name == "STORAGE" else (threads + FAN_OUT_WORKERS) // 2
+    return Bulkhead(name.lower(),
+                    limit=int(service_setting(name, "MAX_CONCURRENCY", max(1, default))),
+                    max_queue=int(service_setting(name, "MAX_QUEUE", 0)),
+                    queue_timeout=float(service_setting(name, "QUEUE_TIMEOUT", 0)))
+
+
+def service_interceptors(name):
+    return [
+        in_flight,
+        TracingInterceptor(name.lower()),
+        CoalescingInterceptor(READ_METHODS),
+        MetricsInterceptor(name.lower()),
+        BulkheadInterceptor(service_bulkhead(name)),
+        CircuitBreakerInterceptor(name.lower(),
+                                  threshold=int(os.getenv("CIRCUIT_BREAKER_THRESHOLD", 5)),
+                                  reset_timeout=float(os.getenv("CIRCUIT_BREAKER_RESET_TIMEOUT", 10))),
+        # Outside the retries, so GRPC_TIMEOUT bounds all attempts together
+        DeadlineInterceptor(float(os.getenv("GRPC_TIMEOUT", 3)), GRPC_TIMEOUTS),
+        RetryInterceptor(READ_METHODS, retry_budget, attempts=int(os.getenv("GRPC_RETRY_ATTEMPTS", 3))),
+    ]
 
-auth_service_channel = grpc.insecure_channel(
-    f"{os.getenv('AUTH_SERVICE_HOST')}:{os.getenv('AUTH_SERVICE_PORT')}"
-)
-auth_service_stub = auth_pb2_grpc.AuthServiceStub(auth_service_channel)
 
-user_service_channel = grpc.insecure_channel(
-    f"{os.getenv('USER_SERVICE_HOST')}:{os.getenv('USER_SERVICE_PORT')}")
-user_service_stub = user_pb2_grpc.UserServiceStub(user_service_channel)
+# Channel pools are opened lazily in the process that uses them, see PooledStub
+auth_service_stub = PooledStub(auth_pb2_grpc.AuthServiceStub, "AUTH", service_interceptors)
+user_service_stub = PooledStub(user_pb2_grpc.UserServiceStub, "USER", service_interceptors)
+election_service_stub = PooledStub(election_pb2_grpc.ElectionServiceStub, "ELECTION", service_interceptors)
+storage_service_stub = PooledStub(storage_pb2_grpc.StorageServiceStub, "STORAGE", service_interceptors)
 
-election_service_channel = grpc.insecure_channel(
-    f"{os.getenv('ELECTION_SERVICE_HOST')}:{os.getenv('ELECTION_SERVICE_PORT')}")
-election_service_stub = election_pb2_grpc.ElectionServiceStub(election_service_channel)
+# Global election data is the same for every user, so it is shared between requests
+election_cache = TTLCache(float(os.getenv("ELECTION_CACHE_TTL", 5)))
 
-storage_service_channel = grpc.insecure_channel(
-    f"{os.getenv('STORAGE_SERVICE_HOST')}:{os.getenv('STORAGE_SERVICE_PORT')}")
-storage_service_stub = storage_pb2_grpc.StorageServiceStub(storage_service_channel)
+# Per-user lookups (get_rp, get_avatar, get_friend_stats) keyed by capy-uuid
+user_cache = UserCache(ttl=float(os.getenv("USER_CACHE_TTL", 30)),
+                       max_users=int(os.getenv("USER_CACHE_MAX_USERS", 10000)),
+                       max_bytes=int(os.getenv("USER_CACHE_MAX_BYTES", 16 * 1024 * 1024)))
+CacheMetrics("user_cache", user_cache)
 
 from controller.api import api
 
@@ -1,24 +1,34 @@
 import logging
+import os
 import time
 
 import election_service.election_grpc_pb2 as election_pb2
+import grpc
 import storage.storage_service_pb2 as storage_pb2
 import user_service.user_service_pb2 as user_pb2
 from flasgger import swag_from
-from flask import make_response, request
-from werkzeug.utils import secure_filename
-
-from controller import (election_service_stub, storage_service_stub,
-                        user_service_stub)
-
-logging.basicConfig(level=logging.DEBUG,
-                    format='%(asctime)s - %(name)s - '
-                           '%(levelname)s - %(message)s')
-
-from controller.utils import generate_response
+from flask import Response, make_response, request
+
+from controller import (election_cache, election_service_stub,
+                        storage_service_stub, user_cache, user_service_stub)
+from controller.broadcast import (STREAM_POLL_INTERVAL, STREAM_RETRY_AFTER,
+                                  Broadcaster)
+from controller.http_cache import conditional
+from controller.images import (AVATAR_MAX_UPLOAD_SIZE, image_executor,
+                               iter_chunks, normalize_avatar, read_limited)
+from controller.ratelimit import body_key, rate_limit
+from controller.rpc_routes import RpcRoute, register_routes
+from controller.search import find_users, search_cache
+from controller.serialization import CANDIDATE, STATISTIC, MessageFields
+from controller.session import forget_session, session_required, user_call
+from controller.upload import UPLOAD_MAX_CHUNK_SIZE, UploadStream
+from controller.utils import fan_out, fan_out_bounded, generate_response
 
 from . import api
 
+PEER_INFO_BATCH_LIMIT = int(os.getenv("PEER_INFO_BATCH_LIMIT", 100))
+PEER_INFO_BATCH_CONCURRENCY = int(os.getenv("PEER_INFO_BATCH_CONCURRENCY", 8))
+
 
 @swag_from({
     "tags": ["User"],
@@ -117,35 +127,40 @@ from . import api
 def get_user_data():
     logging.info("[ | API | GET USER DATA ] - Get user data request. ----- START -----")
     capy_uuid = request.cookies.get("capy-uuid")
-    logging.info(f"[ | API | GET USER DATA ] - READ COOKIE - UUID: {capy_uuid}")
     if not capy_uuid:
         logging.info("[ | API | GET USER DATA ] - Not such cookie. ----- END -----")
         return generate_response(status_code=10, status="FAIL", description="No cookie"), 401
-    logging.info("[ | API | GET USER DATA ] - Start request to user_service (get_rp method)")
-    rp_request = user_pb2.GetRpRequest(capy_uuid=capy_uuid)
-    rp_response = user_service_stub.get_rp(rp_request)
-    # response = make_request(user_pb2.GetRpRequest, user_service_stub.get_rp, {"capy_uuid": capy_uuid})
+    logging.info("[ | API | GET USER DATA ] - Start requests to user_service (get_rp, get_avatar methods)")
+    rp_future, avatar_future = fan_out(
+        (user_call, capy_uuid, "get_rp", user_pb2.GetRpRequest(capy_uuid=capy_uuid)),
+        (user_call, capy_uuid, "get_avatar", user_pb2.GetAvatarRequest(capy_uuid=capy_uuid)),
+    )
+    rp_response = rp_future.result()
     logging.info("[ | API | GET USER DATA ] - Receive response from user_service (get_rp method)")
     if rp_response.status == 13:
         logging.info("[ | API | GET USER DATA ] - Error response from user_service (get_rp method). ----- END -----")
-        response = make_response(generate_response(status="FAIL", status_code=13,
-                                                   description="Ваш токен устарел. Необходимо авторизоваться заново"))
-        response.set_cookie("capy-uuid", "", samesite="None", secure=True)
-        return response, 200
+        forget_session(capy_uuid)
+        return token_expired()
     if rp_response.status != 0:
         logging.info("[ | API | GET USER DATA ] - Error response from user_service (get_rp method). ----- END -----")
         return generate_response(status="FAIL", status_code=1, description=rp_response.description), 401
-    req = user_pb2.GetAvatarRequest(capy_uuid=capy_uuid)
-    res = user_service_stub.get_avatar(req)
-    avatar = None
-    if not res or not res.avatar:
-        logging.info("[ | API | GET USER DATA ] - No Set avatar. Take default ----- END -----")
+    logging.info("[ | API | GET USER DATA ] - Success response from user_service (get_rp method). ----- END -----")
+    return generate_response(data=user_data(capy_uuid, rp_response, avatar_future.result()))
+
+
+def token_expired():
+    response = make_response(generate_response(status="FAIL", status_code=13,
+                                               description="Ваш токен устарел. Необходимо авторизоваться заново"))
+    response.set_cookie("capy-uuid", "", samesite="None", secure=True)
+    return response, 200
+
+
+def user_data(capy_uuid, rp_response, avatar_response):
+    if not avatar_response or not avatar_response.avatar:
         avatar = "https://capyavatars.storage.yandexcloud.net/avatar/default/default.webp"
     else:
-        logging.info("[ | API | GET USER DATA ] - Avatar set ----- END -----")
-        avatar = f"https://capyavatars.storage.yandexcloud.net/avatar/{capy_uuid}/{res.avatar}"
-    logging.info("[ | API | GET USER DATA ] - Success response from user_service (get_rp method). ----- END -----")
-    data = {
+        avatar = f"https://capyavatars.storage.yandexcloud.net/avatar/{capy_uuid}/{avatar_response.avatar}"
+    return {
         "coins": rp_response.coins,
         "prp": rp_response.prp,
         "crp": rp_response.crp,
@@ -155,83 +170,29 @@ def get_user_data():
         "login": rp_response.login,
         "avatar": avatar
     }
-    return generate_response(data=data)
 
 
 @api.get("/check_election")
 def check_election():
-    election_request = election_pb2.Empty()
-    election_response = election_service_stub.GetElection(election_request)
-    return generate_response(data={"election_status": election_response.status})
+    return generate_response(data={"election_status": get_election().status})
+
+
+def get_election():
+    return election_cache.get("GetElection", lambda: election_service_stub.GetElection(election_pb2.Empty()))
 
 
 @api.get("/check_uuid")
 def check_uuid():
     tmp_uuid = request.cookies.get("tmp-uuid")
     capy_uuid = request.cookies.get("capy-uuid")
-    print(tmp_uuid, capy_uuid)
     if not tmp_uuid and not capy_uuid:
         return {"status": 1}
 
     return {"status": 0}
 
 
-@api.post("/register_candidate")
-def register_candidate():
-    tmp_uuid = request.cookies.get("tmp-uuid")
-    capy_uuid = request.cookies.get("capy-uuid")
-
-    about = request.json.get("about")
-
-    if not tmp_uuid and not capy_uuid:
-        return {"status": 1}
-
-    if not about:
-        return {"status": 2}
-
-    if tmp_uuid:
-        req = election_pb2.SetCandidateRequest(uuid=tmp_uuid, about=about)
-        res = election_service_stub.SetCandidateTmp(req)
-        return {"status": res.status, "description": res.description}
-    if capy_uuid:
-        req = election_pb2.SetCandidateRequest(uuid=capy_uuid, about=about)
-        res = election_service_stub.SetCandidateCapy(req)
-        return {"status": res.status, "description": res.description}
-
-
-@api.get("/check_register")
-def check_register():
-    tmp_uuid = request.cookies.get("tmp-uuid")
-    capy_uuid = request.cookies.get("capy-uuid")
-
-    print(tmp_uuid, capy_uuid)
-
-    if not tmp_uuid and not capy_uuid:
-        return {"status": 0}
-
-    if tmp_uuid:
-        req = election_pb2.CheckCandidateRequest(uuid=tmp_uuid)
-        res = election_service_stub.CheckCandidateTmp(req)
-        return {"status": res.status}
-    elif capy_uuid:
-        req = election_pb2.CheckCandidateRequest(uuid=capy_uuid)
-        res = election_service_stub.CheckCandidateCapy(req)
-        return {"status": res.status}
-
-
-@api.post("/send_code")
-def send_mail():
-    nickname = request.json.get("nickname")
-    if not nickname:
-        return {"status": 1}
-
-    req = election_pb2.SendPasswordRequest(mail=nickname)
-    res = election_service_stub.SendPassword(req)
-
-    return {"status": res.status, "description": res.description}
-
-
 @api.post("/confirm_code")
+@rate_limit("confirm_code", rate=1 / 10, burst=5, key=body_key("nickname"))
 def confirm_code():
     nickname = request.json.get("nickname")
     code = request.json.get("code")
@@ -250,100 +211,47 @@ def confirm_code():
     return response
 
 
+STATUS = MessageFields(status="status", description="description")
+MY_VOICE = MessageFields(data=("candidates", CANDIDATE), status="status", count="count", description="description")
+UNAUTHORIZED = {"status": 1, "description": "Вы не авторизованы для этой операции"}
+
+# Election endpoints that are a single RPC, called as *Tmp or *Capy depending on the caller's cookie
+register_routes(api, election_service_stub, [
+    RpcRoute("/register_candidate", "SetCandidate{kind}", election_pb2.SetCandidateRequest, STATUS,
+             methods=["POST"], uuid_field="uuid", body={"about": "about"},
+             unauthorized={"status": 1}, missing={"status": 2}, on_success=[election_cache.invalidate]),
+    RpcRoute("/check_register", "CheckCandidate{kind}", election_pb2.CheckCandidateRequest,
+             MessageFields(status="status"), uuid_field="uuid", unauthorized={"status": 0}),
+    RpcRoute("/send_code", "SendPassword", election_pb2.SendPasswordRequest, STATUS,
+             methods=["POST"], body={"mail": "nickname"}, missing={"status": 1},
+             decorators=[rate_limit("send_code", rate=1 / 30, burst=3)], endpoint="send_mail"),
+    RpcRoute("/vote", "Vote{kind}", election_pb2.VoteRequest, STATUS,
+             methods=["POST"], uuid_field="uuid", body={"candidate_id": "id"},
+             unauthorized=UNAUTHORIZED, missing={"status": 1, "description": "Не указано за кого голосовать"},
+             on_success=[election_cache.invalidate], decorators=[rate_limit("vote", rate=1, burst=5)]),
+    RpcRoute("/my_voice", "MyCandidates{kind}", election_pb2.MyCandidateRequest, MY_VOICE,
+             uuid_field="uuid", unauthorized={**UNAUTHORIZED, "data": [], "count": 0}),
+])
+
+
 @api.get("/candidates")
+@conditional("public, no-cache")
 def candidates():
-    print("req")
-    data = election_service_stub.GetCandidates(election_pb2.Empty())
+    data = election_cache.get(
+        "GetCandidates", lambda: election_service_stub.GetCandidates(election_pb2.Empty()))
     return {
         "status": data.status,
-        "data": [{
-            "avatar": candidate.avatar,
-            "id": candidate.id,
-            "about": candidate.about,
-            "login": candidate.login
-        } for candidate in data.candidates],
+        "data": CANDIDATE.many(data.candidates),
         "description": data.description
     }
 
 
-@api.post("/vote")
-def vote():
-    tmp_uuid = request.cookies.get("tmp-uuid")
-    capy_uuid = request.cookies.get("capy-uuid")
-
-    id = request.json.get("id")
-
-    print(tmp_uuid, capy_uuid)
-
-    if not tmp_uuid and not capy_uuid:
-        return {"status": 1, "description": "Вы не авторизованы для этой операции"}
-
-    if not id:
-        return {"status": 1, "description": "Не указано за кого голосовать"}
-
-    if tmp_uuid:
-        req = election_pb2.VoteRequest(uuid=tmp_uuid, candidate_id=id)
-        res = election_service_stub.VoteTmp(req)
-        return {
-            "status": res.status,
-            "description": res.description
-        }
-    if capy_uuid:
-        req = election_pb2.VoteRequest(uuid=capy_uuid, candidate_id=id)
-        res = election_service_stub.VoteCapy(req)
-        return {
-            "status": res.status,
-            "description": res.description
-        }
-
-
-@api.get("/my_voice")
-def my_voice():
-    tmp_uuid = request.cookies.get("tmp-uuid")
-    capy_uuid = request.cookies.get("capy-uuid")
-
-    print(tmp_uuid, capy_uuid)
-
-    if not tmp_uuid and not capy_uuid:
-        return {"status": 1, "description": "Вы не авторизованы для этой операции", "data": [], "count": 0}
-
-    if tmp_uuid:
-        req = election_pb2.MyCandidateRequest(uuid=tmp_uuid)
-        res = election_service_stub.MyCandidatesTmp(req)
-        return {
-            "data": [{
-                "avatar": candidate.avatar,
-                "id": candidate.id,
-                "about": candidate.about,
-                "login": candidate.login
-            } for candidate in res.candidates],
-            "status": res.status,
-            "count": res.count,
-            "description": res.description
-        }
-    if capy_uuid:
-        req = election_pb2.MyCandidateRequest(uuid=capy_uuid)
-        res = election_service_stub.MyCandidatesCapy(req)
-        return {
-            "data": [{
-                "avatar": candidate.avatar,
-                "id": candidate.id,
-                "about": candidate.about,
-                "login": candidate.login
-            } for candidate in res.candidates],
-            "status": res.status,
-            "count": res.count,
-            "description": res.description
-        }
-
-
 @api.get("/vote_statistic")
+@conditional("private, no-cache")
 def vote_statistic():
     tmp_uuid = request.cookies.get("tmp-uuid")
     capy_uuid = request.cookies.get("capy-uuid")
 
-    print(tmp_uuid, capy_uuid)
-
     if not tmp_uuid and not capy_uuid:
         return {"status": 1,
                 "description": "Вы не авторизованы для этой операции",
@@ -352,51 +260,111 @@ def vote_statistic():
                 "count_voter": 0,
                 "percent_voter": 0}
 
-    res = election_service_stub.GetStatistic(election_pb2.Empty())
+    res = election_cache.get(
+        "GetStatistic", lambda: election_service_stub.GetStatistic(election_pb2.Empty()))
     return {
         "status": 0,
         "description": "OK",
-        "data": [{
-            "nickname": i.nickname,
-            "count": i.count,
-            "percent": i.percent
-        } for i in res.candidates],
+        "data": STATISTIC.many(res.candidates),
+        "all_capybaras": res.all_capybaras,
+        "count_voter": res.count_voter,
+        "percent_voter": res.percent_voter
+    }
+
+
+def load_statistic():
+    res = election_cache.get(
+        "GetStatistic", lambda: election_service_stub.GetStatistic(election_pb2.Empty()))
+    return {
+        "data": {i.nickname: {"count": i.count, "percent": i.percent} for i in res.candidates},
         "all_capybaras": res.all_capybaras,
         "count_voter": res.count_voter,
         "percent_voter": res.percent_voter
     }
 
 
-def prepare(file, capy_uuid, filename):
-    while True:
-        piece = file.read(1024)
-        if not piece:
-            break
-        yield storage_pb2.PutRequest(uuid=capy_uuid, filename=filename, data=piece)
+statistic_broadcaster = Broadcaster("statistic", load_statistic, STREAM_POLL_INTERVAL)
+
+
+# Server-Sent Events: a "snapshot" event with the statistic keyed by nickname,
+# then "delta" events with only the totals and candidates that changed.
+# GetStatistic is polled once per process however many clients are watching.
+@api.get("/vote_statistic/stream")
+def vote_statistic_stream():
+    tmp_uuid = request.cookies.get("tmp-uuid")
+    capy_uuid = request.cookies.get("capy-uuid")
+
+    if not tmp_uuid and not capy_uuid:
+        return {"status": 1, "description": "Вы не авторизованы для этой операции"}
+
+    subscriber = statistic_broadcaster.subscribe()
+    if subscriber is None:
+        # Every stream slot of this worker is taken, the client polls /vote_statistic instead
+        busy = {"status": 1, "description": "Слишком много подключений, попробуйте позже"}
+        return busy, 503, {"Retry-After": str(STREAM_RETRY_AFTER)}
+    return Response(statistic_broadcaster.stream(subscriber), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def prepare(chunks, capy_uuid, filename):
+    # uuid and filename are sent only once, in the first message of the stream
+    yield storage_pb2.PutRequest(uuid=capy_uuid, filename=filename, data=next(chunks, b""))
+    for piece in chunks:
+        yield storage_pb2.PutRequest(data=piece)
 
 
 @api.post("/upload")
+@session_required
 def upload():
     capy_uuid = request.cookies.get("capy-uuid")
 
     if not capy_uuid:
         return {"status": 1, "description": "Вы не авторизованы для этой операции"}
 
-    avatar = request.files.get("avatar")
+    # The body is parsed from the raw stream, request.files would spool it all first
+    boundary = request.mimetype_params.get("boundary")
+    avatar = None
+    if request.mimetype == "multipart/form-data" and boundary:
+        avatar = UploadStream(request.stream, boundary, "avatar")
 
-    if not avatar:
+    if not avatar or not avatar.open():
         return {"status": 1, "description": "Не указан файл"}
 
-    fn = secure_filename(avatar.filename)
-    fn_ext = fn.rsplit('.', 1)[1].lower() if '.' in fn else ''
-    t = time.time()
-    filename = f'{int(t)}.{fn_ext}' if fn_ext else str(int(t))
-    res = storage_service_stub.Put(prepare(avatar, capy_uuid, filename))
+    # Decoding needs the whole file, so it is read into memory, but never
+    # past AVATAR_MAX_UPLOAD_SIZE
+    data = read_limited(avatar.chunks(), AVATAR_MAX_UPLOAD_SIZE)
+    if data is None:
+        return {"status": 1, "description": "Файл слишком большой"}
+
+    images = image_executor.submit(normalize_avatar, data).result()
+    del data
+    if not images:
+        return {"status": 1, "description": "Файл не является изображением"}
+
+    # The largest WebP is the avatar itself ({t}.webp, the name get_user_data
+    # links to); smaller sizes are stored next to it only once it exists
+    t = int(time.time())
+    (_, avatar_image), *thumbnails = images
+    res = storage_service_stub.Put(prepare(iter_chunks(avatar_image, UPLOAD_MAX_CHUNK_SIZE), capy_uuid,
+                                           f'{t}.webp'))
+    if res.status == 0:
+        futures = fan_out(*[
+            (storage_service_stub.Put, prepare(iter_chunks(image, UPLOAD_MAX_CHUNK_SIZE), capy_uuid,
+                                               f'{t}_{size}.webp'))
+            for size, image in thumbnails
+        ])
+        for future in futures:
+            thumbnail = future.result()
+            if thumbnail.status != 0:
+                logging.warning("[ | API | UPLOAD ] - Thumbnail was not stored: %s", thumbnail.description)
+        user_cache.invalidate(capy_uuid)
 
     return {"status": res.status, "description": res.description}
 
 
 @api.get("/peer_info")
+@session_required
+@conditional("private, max-age=30")
 def peer_info():
     capy_uuid = request.cookies.get("capy-uuid")
     nickname = request.args.get("nickname")
@@ -407,6 +375,10 @@ def peer_info():
     if not nickname:
         return {"status": 1, "description": "Не указан nickname"}
 
+    return get_peer(capy_uuid, nickname)
+
+
+def get_peer(capy_uuid, nickname):
     res = user_service_stub.get_peer_info(user_pb2.GetPeerInfoRequest(
         request_uuid=capy_uuid,
         nickname=nickname
@@ -424,17 +396,54 @@ def peer_info():
     }
 
 
+@api.post("/peer_info/batch")
+@session_required
+def peer_info_batch():
+    capy_uuid = request.cookies.get("capy-uuid")
+    body = request.get_json(silent=True)
+    nicknames = body.get("nicknames") if isinstance(body, dict) else None
+
+    if not capy_uuid:
+        return {"status": 1, "description": "Вы не авторизованы для этой операции"}
+
+    if not isinstance(nicknames, list) or not all(isinstance(nickname, str) for nickname in nicknames):
+        return {"status": 1, "description": "Не указан список nicknames"}
+
+    # Repeated names are resolved once
+    nicknames = list(dict.fromkeys(nickname for nickname in nicknames if nickname))
+    if len(nicknames) > PEER_INFO_BATCH_LIMIT:
+        return {"status": 1, "description": f"Не больше {PEER_INFO_BATCH_LIMIT} nicknames за запрос"}
+
+    futures = fan_out_bounded(lambda nickname: get_peer(capy_uuid, nickname), nicknames,
+                              PEER_INFO_BATCH_CONCURRENCY)
+    peers = {}
+    for nickname, future in zip(nicknames, futures):
+        try:
+            peers[nickname] = future.result()
+        except grpc.RpcError:
+            logging.warning("[ | API | PEER INFO BATCH ] - get_peer_info failed for %s", nickname)
+            peers[nickname] = {"status": 1, "description": "Сервис временно недоступен", "data": {}}
+
+    return {"status": 0, "description": "OK", "data": peers}
+
+
 @api.get("/get_friend_stats")
+@session_required
+@conditional("private, no-cache")
 def get_friend_stats():
     capy_uuid = request.cookies.get("capy-uuid")
 
     if not capy_uuid:
         return {"status": 1, "description": "Вы не авторизованы для этой операции"}
 
-    res = user_service_stub.get_friend_stats(user_pb2.GetFriendStatsRequest(
+    res = user_call(capy_uuid, "get_friend_stats", user_pb2.GetFriendStatsRequest(
         capy_uuid=capy_uuid
     ))
 
+    return friend_stats_response(res)
+
+
+def friend_stats_response(res):
     return {
         "status": res.status,
         "description": res.description,
@@ -446,6 +455,7 @@ def get_friend_stats():
 
 
 @api.get("/search_user")
+@session_required
 def search_user():
     capy_uuid = request.cookies.get("capy-uuid")
     nickname = request.args.get("nickname")
@@ -456,23 +466,11 @@ def search_user():
     if not nickname:
         return {"status": 1, "description": "Не указан nickname"}
 
-    res = user_service_stub.search_user(user_pb2.SearchUserRequest(
-        capy_uuid=capy_uuid,
-        nickname=nickname
-    ))
-
-    return {
-        "status": res.status,
-        "description": res.description,
-        "data": {
-            "friends": [{"nickname": i.login, "avatar": i.avatar} for i in res.friends],
-            "on_platform": [{"nickname": i.login, "avatar": i.avatar} for i in res.on_platform],
-            "out_platform": [{"nickname": i.login, "avatar": i.avatar} for i in res.out_platform]
-        }
-    }
+    return find_users(capy_uuid, nickname)
 
 
 @api.post("/add_friend")
+@session_required
 def add_friend():
     capy_uuid = request.cookies.get("capy-uuid")
     nickname = request.json.get("nickname")
@@ -487,8 +485,69 @@ def add_friend():
         capy_uuid=capy_uuid,
         nickname=nickname
     ))
+    if res.status == 0:
+        user_cache.invalidate(capy_uuid)
+        search_cache.invalidate(capy_uuid)
 
     return {
         "status": res.status,
         "description": res.description
     }
+
+
+# Everything the frontend loads after login in one request. The backend calls
+# run in parallel and each section fails on its own, so one slow or broken
+# service doesn't blank the whole page.
+@api.get("/dashboard")
+def dashboard():
+    tmp_uuid = request.cookies.get("tmp-uuid")
+    capy_uuid = request.cookies.get("capy-uuid")
+
+    if not tmp_uuid and not capy_uuid:
+        return generate_response(status_code=10, status="FAIL", description="No cookie"), 401
+
+    # Election calls use the same identity as the standalone endpoints: tmp-uuid wins
+    kind, election_uuid = ("Tmp", tmp_uuid) if tmp_uuid else ("Capy", capy_uuid)
+    calls = {
+        "election": (get_election,),
+        "register": (getattr(election_service_stub, f"CheckCandidate{kind}"),
+                     election_pb2.CheckCandidateRequest(uuid=election_uuid)),
+        "my_voice": (getattr(election_service_stub, f"MyCandidates{kind}"),
+                     election_pb2.MyCandidateRequest(uuid=election_uuid)),
+    }
+    if capy_uuid:
+        calls.update({
+            "rp": (user_call, capy_uuid, "get_rp", user_pb2.GetRpRequest(capy_uuid=capy_uuid)),
+            "avatar": (user_call, capy_uuid, "get_avatar", user_pb2.GetAvatarRequest(capy_uuid=capy_uuid)),
+            "friends": (user_call, capy_uuid, "get_friend_stats",
+                        user_pb2.GetFriendStatsRequest(capy_uuid=capy_uuid)),
+        })
+    futures = dict(zip(calls, fan_out(*calls.values())))
+
+    def section(build, *names):
+        try:
+            return build(*(futures[name].result() for name in names))
+        except grpc.RpcError as error:
+            code = error.code() if isinstance(error, grpc.Call) else None
+            logging.warning("[ | API | DASHBOARD ] - %s failed: %s", "/".join(names), code)
+            return generate_response(status="FAIL", status_code=1, description="Сервис временно недоступен")
+
+    data = {
+        "election": section(lambda res: generate_response(data={"election_status": res.status}), "election"),
+        "register": section(lambda res: {"status": res.status}, "register"),
+        "my_voice": section(MY_VOICE, "my_voice"),
+    }
+    if capy_uuid:
+        def user(rp_response, avatar_response):
+            if rp_response.status != 0:
+                return generate_response(status="FAIL", status_code=rp_response.status,
+                                         description=rp_response.description)
+            return generate_response(data=user_data(capy_uuid, rp_response, avatar_response))
+
+        data["user"] = section(user, "rp", "avatar")
+        if data["user"]["status_code"] == 13:
+            forget_session(capy_uuid)
+            return token_expired()
+        data["friends"] = section(friend_stats_response, "friends")
+
+    return generate_response(data=data)
@@ -1,15 +1,34 @@
-from unittest.mock import patch
+import io
+from unittest.mock import MagicMock, patch
 
+import grpc
 import pytest
 from election_service import election_grpc_pb2
+from google.protobuf import message_factory
+from PIL import Image
 from user_service import user_service_pb2
 
-from controller import app
+from controller import app, election_cache, user_cache
+from controller.images import AVATAR_SIZES
+from controller.search import search_cache
+from controller.session import token_verifier
+
+USER = user_service_pb2.DESCRIPTOR.services_by_name["UserService"]
+ELECTION = election_grpc_pb2.DESCRIPTOR.services_by_name["ElectionService"]
+
+
+# Builds the response message of a stub method from the service descriptor
+def reply(service, method, **fields):
+    return message_factory.GetMessageClass(service.methods_by_name[method].output_type)(**fields)
 
 
 @pytest.fixture
 def client():
     app.config['TESTING'] = True
+    election_cache.invalidate()
+    user_cache.invalidate()
+    token_verifier.invalidate()
+    search_cache.invalidate()
     with app.test_client() as client:
         yield client
 
@@ -65,6 +84,21 @@ def test_get_user_data_with_cookie(mock_get_avatar, mock_get_rp, client):
     }
 
 
+@patch("controller.user_service_stub.get_rp")
+@patch("controller.user_service_stub.get_avatar")
+def test_get_user_data_token_expired(mock_get_avatar, mock_get_rp, client):
+    mock_get_rp.return_value = user_service_pb2.GetRpResponse(
+        status=13,
+        description="Token expired"
+    )
+    mock_get_avatar.return_value = user_service_pb2.GetAvatarResponse(status=0, avatar="test")
+    client.set_cookie('capy-uuid', 'test_uuid')
+    response = client.get('/api/get_user_data')
+    assert response.status_code == 200
+    assert response.json["status_code"] == 13
+    assert "capy-uuid=;" in response.headers["Set-Cookie"]
+
+
 def test_check_election_ok(client):
     mock_election_response = election_grpc_pb2.GetElectionResponse(status=0)
     with patch('controller.election_service_stub.GetElection', return_value=mock_election_response) as mock_get_election:
@@ -95,3 +129,213 @@ def test_check_election_error(client):
                 "election_status": 1
             }
         }
+
+
+def test_candidates_cached(client):
+    mock_response = reply(ELECTION, "GetCandidates", status=0, description="OK")
+    with patch('controller.election_service_stub.GetCandidates', return_value=mock_response) as mock_get_candidates:
+        assert client.get('/api/candidates').json == {"status": 0, "data": [], "description": "OK"}
+        assert client.get('/api/candidates').json == {"status": 0, "data": [], "description": "OK"}
+        mock_get_candidates.assert_called_once()
+
+
+def test_vote_invalidates_election_cache(client):
+    mock_response = reply(ELECTION, "GetCandidates", status=0, description="OK")
+    mock_vote = reply(ELECTION, "VoteCapy", status=0, description="OK")
+    client.set_cookie('capy-uuid', 'test_uuid')
+    with patch('controller.election_service_stub.GetCandidates', return_value=mock_response) as mock_get_candidates, \
+            patch('controller.election_service_stub.VoteCapy', return_value=mock_vote):
+        client.get('/api/candidates')
+        assert client.post('/api/vote', json={"id": 1}).json == {"status": 0, "description": "OK"}
+        client.get('/api/candidates')
+        assert mock_get_candidates.call_count == 2
+
+
+def test_friend_stats_cached_until_add_friend(client):
+    mock_stats = reply(USER, "get_friend_stats", status=0, friends=1, subscribers=2)
+    mock_add = reply(USER, "add_friend", status=0, description="OK")
+    client.set_cookie('capy-uuid', 'test_uuid')
+    with patch('controller.user_service_stub.get_friend_stats', return_value=mock_stats) as mock_get_stats, \
+            patch('controller.user_service_stub.add_friend', return_value=mock_add), \
+            patch('controller.user_service_stub.get_rp', return_value=user_service_pb2.GetRpResponse(status=0)):
+        assert client.get('/api/get_friend_stats').json["data"] == {"friends": 1, "subscribers": 2}
+        client.get('/api/get_friend_stats')
+        assert mock_get_stats.call_count == 1
+        client.post('/api/add_friend', json={"nickname": "capy"})
+        client.get('/api/get_friend_stats')
+        assert mock_get_stats.call_count == 2
+
+
+@patch("controller.user_service_stub.get_rp")
+@patch("controller.user_service_stub.get_friend_stats")
+def test_expired_session_rejected_at_edge(mock_get_friend_stats, mock_get_rp, client):
+    mock_get_rp.return_value = user_service_pb2.GetRpResponse(status=13)
+    client.set_cookie('capy-uuid', 'test_uuid')
+    response = client.get('/api/get_friend_stats')
+    assert response.json["status"] == 13
+    client.get('/api/get_friend_stats')
+    mock_get_rp.assert_called_once()
+    mock_get_friend_stats.assert_not_called()
+
+
+def png(width, height):
+    output = io.BytesIO()
+    Image.new("RGB", (width, height), (120, 80, 40)).save(output, "PNG")
+    return output.getvalue()
+
+
+@patch("controller.user_service_stub.get_rp")
+@patch("controller.storage_service_stub.Put")
+def test_upload_stores_webp_avatar_then_thumbnails(mock_put, mock_get_rp, client):
+    mock_get_rp.return_value = user_service_pb2.GetRpResponse(status=0)
+    streams = []
+
+    def put(request_iterator):
+        streams.append(list(request_iterator))
+        return MagicMock(status=0, description="OK")
+
+    mock_put.side_effect = put
+    client.set_cookie('capy-uuid', 'test_uuid')
+    response = client.post('/api/upload', data={"avatar": (io.BytesIO(png(2000, 1500)), "avatar.PNG")},
+                           content_type="multipart/form-data")
+    assert response.json == {"status": 0, "description": "OK"}
+    (avatar, *thumbnails) = streams
+    assert avatar[0].filename.count("_") == 0
+    assert len(thumbnails) == len(AVATAR_SIZES) - 1
+    for messages, size in zip(streams, AVATAR_SIZES):
+        assert messages[0].uuid == "test_uuid"
+        assert messages[0].filename.endswith(".webp")
+        assert all(not m.uuid and not m.filename for m in messages[1:])
+        image = Image.open(io.BytesIO(b"".join(m.data for m in messages)))
+        assert image.format == "WEBP"
+        assert image.size == (size, size)
+
+
+@patch("controller.user_service_stub.get_rp")
+@patch("controller.storage_service_stub.Put")
+def test_upload_rejects_non_image(mock_put, mock_get_rp, client):
+    mock_get_rp.return_value = user_service_pb2.GetRpResponse(status=0)
+    client.set_cookie('capy-uuid', 'test_uuid')
+    response = client.post('/api/upload', data={"avatar": (io.BytesIO(b"not an image"), "avatar.png")},
+                           content_type="multipart/form-data")
+    assert response.json["status"] == 1
+    mock_put.assert_not_called()
+
+
+@patch("controller.user_service_stub.get_rp")
+@patch("controller.storage_service_stub.Put")
+def test_upload_skips_thumbnails_when_avatar_fails(mock_put, mock_get_rp, client):
+    mock_get_rp.return_value = user_service_pb2.GetRpResponse(status=0)
+
+    def put(request_iterator):
+        list(request_iterator)
+        return MagicMock(status=1, description="Storage error")
+
+    mock_put.side_effect = put
+    client.set_cookie('capy-uuid', 'test_uuid')
+    response = client.post('/api/upload', data={"avatar": (io.BytesIO(png(64, 64)), "avatar.png")},
+                           content_type="multipart/form-data")
+    assert response.json == {"status": 1, "description": "Storage error"}
+    mock_put.assert_called_once()
+
+
+@patch("controller.user_service_stub.get_rp")
+def test_upload_without_file(mock_get_rp, client):
+    mock_get_rp.return_value = user_service_pb2.GetRpResponse(status=0)
+    client.set_cookie('capy-uuid', 'test_uuid')
+    response = client.post('/api/upload', data={"other": "value"}, content_type="multipart/form-data")
+    assert response.json == {"status": 1, "description": "Не указан файл"}
+
+
+def test_metrics_endpoint(client):
+    with patch('controller.election_service_stub.GetElection',
+               return_value=election_grpc_pb2.GetElectionResponse(status=0)):
+        client.get('/api/check_election')
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    body = response.get_data(as_text=True)
+    assert 'controller_http_requests_total{endpoint="api.check_election",method="GET",status="200"}' in body
+    assert "controller_user_cache_hits_total" in body
+
+
+def test_peer_info_batch(client):
+    def get_peer_info(request):
+        if request.nickname == "broken":
+            raise grpc.RpcError()
+        return reply(USER, "get_peer_info", status=0, login=request.nickname)
+
+    client.set_cookie('capy-uuid', 'test_uuid')
+    with patch('controller.user_service_stub.get_peer_info', side_effect=get_peer_info) as mock_get_peer_info, \
+            patch('controller.user_service_stub.get_rp', return_value=user_service_pb2.GetRpResponse(status=0)):
+        response = client.post('/api/peer_info/batch', json={"nicknames": ["capy", "bara", "capy", "broken"]})
+    peers = response.json["data"]
+    assert list(peers) == ["capy", "bara", "broken"]
+    assert peers["capy"]["data"]["login"] == "capy"
+    assert peers["bara"]["status"] == 0
+    assert peers["broken"]["status"] == 1
+    assert mock_get_peer_info.call_count == 3
+
+
+def test_peer_info_batch_requires_list(client):
+    client.set_cookie('capy-uuid', 'test_uuid')
+    with patch('controller.user_service_stub.get_rp', return_value=user_service_pb2.GetRpResponse(status=0)):
+        assert client.post('/api/peer_info/batch', json={"nicknames": "capy"}).json["status"] == 1
+        assert client.post('/api/peer_info/batch', json=["capy"]).json["status"] == 1
+        assert client.post('/api/peer_info/batch', json="capy").json["status"] == 1
+
+
+def test_dashboard(client):
+    client.set_cookie('capy-uuid', 'test_uuid')
+    with patch('controller.user_service_stub.get_rp', return_value=reply(USER, "get_rp", status=0, login="capy")), \
+            patch('controller.user_service_stub.get_avatar', return_value=reply(USER, "get_avatar", status=0)), \
+            patch('controller.user_service_stub.get_friend_stats', side_effect=grpc.RpcError()), \
+            patch('controller.election_service_stub.GetElection', return_value=reply(ELECTION, "GetElection", status=1)), \
+            patch('controller.election_service_stub.CheckCandidateCapy',
+                  return_value=reply(ELECTION, "CheckCandidateCapy", status=0)), \
+            patch('controller.election_service_stub.MyCandidatesCapy',
+                  return_value=reply(ELECTION, "MyCandidatesCapy", status=0, count=0)):
+        data = client.get('/api/dashboard').json["data"]
+    assert data["user"]["data"]["login"] == "capy"
+    assert data["user"]["data"]["avatar"].endswith("/default/default.webp")
+    assert data["election"]["data"] == {"election_status": 1}
+    assert data["register"] == {"status": 0}
+    assert data["my_voice"]["count"] == 0
+    assert data["friends"]["status"] == "FAIL"
+
+
+def test_dashboard_token_expired(client):
+    client.set_cookie('capy-uuid', 'test_uuid')
+    with patch('controller.user_service_stub.get_rp', return_value=reply(USER, "get_rp", status=13)), \
+            patch('controller.user_service_stub.get_avatar'), \
+            patch('controller.user_service_stub.get_friend_stats'), \
+            patch('controller.election_service_stub.GetElection'), \
+            patch('controller.election_service_stub.CheckCandidateCapy'), \
+            patch('controller.election_service_stub.MyCandidatesCapy'):
+        assert client.get('/api/dashboard').json["status_code"] == 13
+
+
+def test_search_user_narrows_cached_prefix(client):
+    found = reply(USER, "search_user", status=0, description="OK",
+                  on_platform=[{"login": "capybara"}, {"login": "Capy"}, {"login": "cat"}])
+    call = MagicMock()
+    call.result.return_value = found
+    client.set_cookie('capy-uuid', 'test_uuid')
+    with patch('controller.user_service_stub.search_user') as mock_search, \
+            patch('controller.user_service_stub.get_rp', return_value=user_service_pb2.GetRpResponse(status=0)):
+        mock_search.future.return_value = call
+        assert len(client.get('/api/search_user?nickname=ca').json["data"]["on_platform"]) == 3
+        response = client.get('/api/search_user?nickname=capy')
+        assert [user["nickname"] for user in response.json["data"]["on_platform"]] == ["capybara", "Capy"]
+        assert mock_search.future.call_count == 1
+
+
+def test_candidates_etag(client):
+    mock_candidates = reply(ELECTION, "GetCandidates", status=0, candidates=[{"id": 1, "login": "capy"}])
+    with patch('controller.election_service_stub.GetCandidates', return_value=mock_candidates):
+        response = client.get('/api/candidates')
+        assert response.headers["Cache-Control"] == "public, no-cache"
+        etag = response.headers["ETag"]
+        response = client.get('/api/candidates', headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+    assert response.headers["ETag"] == etag
@@ -1,17 +1,17 @@
 import logging
 
 import auth_service.authservice_pb2 as pb2
+import grpc
 from flasgger import swag_from
 from flask import make_response, request
 
 from controller import auth_service_stub
+from controller.ratelimit import body_key, rate_limit
+from controller.search import search_cache
+from controller.session import forget_session, token_verifier
 
 from . import auth
 
-logging.basicConfig(level=logging.DEBUG,
-                    format='%(asctime)s - %(name)s - '
-                           '%(levelname)s - %(message)s')
-
 
 def validate_login_data(data):
     if not data.get("username") or not data.get("password"):
@@ -89,6 +89,7 @@ def validate_login_data(data):
     }
 })
 @auth.post("/login")
+@rate_limit("login", rate=1 / 6, burst=10, key=body_key("username"))
 def login():
     logging.info("[ | API | Login ] - Login request. ----- START -----")
     data = validate_login_data(request.json)
@@ -188,7 +189,6 @@ def login():
 @auth.get("/check_signin")
 def check_signin():
     is_uuid = request.cookies.get("capy-uuid")
-    print(is_uuid)
     if not is_uuid:
         return {
             "status": "FAIL",
@@ -196,7 +196,26 @@ def check_signin():
             "message": "Not enough uuid",
             "data": {}
         }, 200
-    # TODO Сделать запрос в БД на подтверждение валидного UUID
+    try:
+        valid = token_verifier.verify(is_uuid)
+    except grpc.RpcError:
+        valid = None
+    if valid is False:
+        response = make_response({
+            "status": "FAIL",
+            "status_code": 13,
+            "message": "Ваш токен устарел. Необходимо авторизоваться заново",
+            "data": {}
+        })
+        response.set_cookie("capy-uuid", "", samesite="None", secure=True)
+        return response, 200
+    if valid is None:
+        return {
+            "status": "FAIL",
+            "status_code": 1,
+            "message": "Unable to verify uuid",
+            "data": {}
+        }, 200
     return {
         "status": "OK",
         "status_code": 0,
@@ -267,7 +286,6 @@ def check_signin():
 @auth.get("/logout")
 def logout():
     is_uuid = request.cookies.get("capy-uuid")
-    print(is_uuid)
     if not is_uuid:
         return {
             "status": "FAIL",
@@ -281,5 +299,7 @@ def logout():
         "message": "Success",
         "data": {}
     })
+    forget_session(is_uuid)
+    search_cache.invalidate(is_uuid)
     response.set_cookie("capy-uuid", "", samesite="None", secure=True)
     return response
@@ -0,0 +1,51 @@
+from unittest.mock import patch
+
+import grpc
+import pytest
+from user_service import user_service_pb2
+
+from controller import app, user_cache
+from controller.session import token_verifier
+
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    user_cache.invalidate()
+    token_verifier.invalidate()
+    with app.test_client() as client:
+        yield client
+
+
+def test_check_signin_no_cookie(client):
+    response = client.get('/auth/check_signin')
+    assert response.json["status_code"] == 2
+
+
+@patch("controller.user_service_stub.get_rp")
+def test_check_signin_valid(mock_get_rp, client):
+    mock_get_rp.return_value = user_service_pb2.GetRpResponse(status=0)
+    client.set_cookie('capy-uuid', 'test_uuid')
+    assert client.get('/auth/check_signin').json["status"] == "OK"
+    assert client.get('/auth/check_signin').json["status"] == "OK"
+    mock_get_rp.assert_called_once()
+
+
+@patch("controller.user_service_stub.get_rp")
+def test_check_signin_expired(mock_get_rp, client):
+    mock_get_rp.return_value = user_service_pb2.GetRpResponse(status=13)
+    client.set_cookie('capy-uuid', 'test_uuid')
+    response = client.get('/auth/check_signin')
+    assert response.json["status"] == "FAIL"
+    assert response.json["status_code"] == 13
+    assert "capy-uuid=;" in response.headers["Set-Cookie"]
+
+
+@patch("controller.user_service_stub.get_rp")
+def test_check_signin_backend_unavailable(mock_get_rp, client):
+    mock_get_rp.side_effect = grpc.RpcError()
+    client.set_cookie('capy-uuid', 'test_uuid')
+    response = client.get('/auth/check_signin')
+    assert response.status_code == 200
+    assert response.json["status_code"] == 1
+    assert response.json["message"] == "Unable to verify uuid"
@@ -0,0 +1,129 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+STREAM_POLL_INTERVAL = float(os.getenv("STREAM_POLL_INTERVAL", 2))
+STREAM_KEEPALIVE = float(os.getenv("STREAM_KEEPALIVE", 15))
+# Streams are closed after this long and the browser reconnects, so a worker
+# can be recycled without waiting for its watchers to leave
+STREAM_MAX_DURATION = float(os.getenv("STREAM_MAX_DURATION", 300))
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", 16))
+# Under gthread every open stream holds one of the worker's threads, so only
+# a quarter of them may stream; a sync worker has a single thread and must not
+# stream at all; under gevent a stream only costs a greenlet. Past the cap
+# (0 included) clients get 503 and fall back to polling. Same defaults as
+# gunicorn.conf.py.
+WORKER_CLASS = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+WORKER_THREADS = int(os.getenv("GUNICORN_THREADS", 8 if WORKER_CLASS == "gthread" else 1))
+STREAM_MAX_SUBSCRIBERS = int(os.getenv("STREAM_MAX_SUBSCRIBERS", {"gevent": 1000, "sync": 0}.get(WORKER_CLASS, WORKER_THREADS // 4)))
+STREAM_RETRY_AFTER = int(os.getenv("STREAM_RETRY_AFTER", 30))
+
+
+def diff(old, new):
+    """What changed from ``old`` to ``new``: totals that differ, items under
+    "data" (keyed by id) that were added or changed, and ids that were removed."""
+    delta = {key: value for key, value in new.items() if key != "data" and old.get(key) != value}
+    changed = {key: item for key, item in new["data"].items() if old["data"].get(key) != item}
+    removed = [key for key in old["data"] if key not in new["data"]]
+    if changed:
+        delta["data"] = changed
+    if removed:
+        delta["removed"] = removed
+    return delta
+
+
+def event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n"
+
+
+class Subscriber:
+    def __init__(self):
+        self.events = queue.Queue(STREAM_QUEUE_SIZE)
+        self.closed = False
+
+    def send(self, message):
+        try:
+            self.events.put_nowait(message)
+        except queue.Full:
+            # Too slow to keep up, it reconnects and starts from a fresh snapshot
+            self.closed = True
+
+
+class Broadcaster:
+    """Polls ``load`` from one thread per process while anyone is listening
+    and pushes the difference to every subscriber when it changes. ``load``
+    returns {"data": {id: item}, **totals}. At most ``max_subscribers``
+    streams are open per process."""
+
+    def __init__(self, name, load, interval, max_subscribers=STREAM_MAX_SUBSCRIBERS):
+        self.name = name
+        self.load = load
+        self.interval = interval
+        self.max_subscribers = max_subscribers
+        self.state = None
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._pid = None
+
+    # Returns None when the process already has max_subscribers streams
+    def subscribe(self):
+        subscriber = Subscriber()
+        with self._lock:
+            if self._pid != os.getpid():
+                if self.max_subscribers <= 0:
+                    return None
+                self._pid = os.getpid()
+                self._subscribers = set()
+                self.state = None
+                threading.Thread(target=self._run, name=f"broadcast-{self.name}", daemon=True).start()
+            elif len(self._subscribers) >= self.max_subscribers:
+                return None
+            self._subscribers.add(subscriber)
+            if self.state is not None:
+                subscriber.send(event("snapshot", self.state))
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    # Nobody is watching any more, the next subscriber starts a new thread
+                    self._pid = None
+                    return
+            try:
+                self.publish(self.load())
+            except Exception as e:
+                logging.warning("[ | BROADCAST | %s ] - load failed: %r", self.name, e)
+            time.sleep(self.interval)
+
+    def publish(self, state):
+        with self._lock:
+            if self.state is None:
+                message = event("snapshot", state)
+            else:
+                delta = diff(self.state, state)
+                message = event("delta", delta) if delta else None
+            self.state = state
+            subscribers = list(self._subscribers)
+        if message is not None:
+            for subscriber in subscribers:
+                subscriber.send(message)
+
+    def stream(self, subscriber, keepalive=STREAM_KEEPALIVE, max_duration=STREAM_MAX_DURATION):
+        deadline = time.monotonic() + max_duration
+        try:
+            yield f"retry: {int(self.interval * 1000)}\n\n"
+            while not subscriber.closed and time.monotonic() < deadline:
+                try:
+                    yield subscriber.events.get(timeout=min(keepalive, max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(subscriber)
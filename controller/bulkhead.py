@@ -0,0 +1,76 @@
+import threading
+
+import grpc
+
+from controller.interceptors import OverloadedError
+from controller.metrics import (BULKHEAD_ACTIVE, BULKHEAD_LIMIT,
+                                BULKHEAD_QUEUED, BULKHEAD_REJECTED)
+
+
+class Bulkhead:
+    """Slots for the calls one backend may have in flight from this process.
+    When all ``limit`` slots are taken up to ``max_queue`` callers wait at
+    most ``queue_timeout`` seconds for one; everyone else is rejected at once
+    with RESOURCE_EXHAUSTED, so a slow backend can't tie up threads that the
+    other backends' requests need."""
+
+    def __init__(self, service, limit, max_queue=0, queue_timeout=0):
+        self.service = service
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.queued = 0
+        self._slots = threading.Condition()
+        self._active = BULKHEAD_ACTIVE.labels(service)
+        self._queued = BULKHEAD_QUEUED.labels(service)
+        self._rejected = BULKHEAD_REJECTED.labels(service)
+        BULKHEAD_LIMIT.labels(service).set(limit)
+
+    def _reject(self):
+        self._rejected.inc()
+        raise OverloadedError(self.service)
+
+    def acquire(self):
+        with self._slots:
+            if self.active >= self.limit:
+                if self.queued >= self.max_queue:
+                    self._reject()
+                self.queued += 1
+                self._queued.inc()
+                try:
+                    free = self._slots.wait_for(lambda: self.active < self.limit, self.queue_timeout)
+                finally:
+                    self.queued -= 1
+                    self._queued.dec()
+                if not free:
+                    self._reject()
+            self.active += 1
+            self._active.inc()
+
+    def release(self, call=None):
+        with self._slots:
+            self.active -= 1
+            self._active.dec()
+            self._slots.notify()
+
+
+class BulkheadInterceptor(grpc.UnaryUnaryClientInterceptor, grpc.StreamUnaryClientInterceptor):
+    def __init__(self, bulkhead):
+        self.bulkhead = bulkhead
+
+    def _call(self, invoke):
+        self.bulkhead.acquire()
+        try:
+            call = invoke()
+        except Exception:
+            self.bulkhead.release()
+            raise
+        call.add_done_callback(self.bulkhead.release)
+        return call
+
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        return self._call(lambda: continuation(client_call_details, request))
+
+    def intercept_stream_unary(self, continuation, client_call_details, request_iterator):
+        return self._call(lambda: continuation(client_call_details, request_iterator))
@@ -0,0 +1,215 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlight:
+    """Runs at most one ``fn`` per key at a time, concurrent callers with the
+    same key wait for that call and share its result or exception."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            return call.wait()
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def forget(self, key=None):
+        with self._lock:
+            if key is None:
+                self._calls.clear()
+            else:
+                self._calls.pop(key, None)
+
+    def forget_where(self, match):
+        with self._lock:
+            for key in [key for key in self._calls if match(key)]:
+                del self._calls[key]
+
+
+class TTLCache:
+    """Loaded values kept for ``ttl`` seconds, which is either a number or a
+    function of the value. With ``max_entries`` it is also an LRU: expired
+    entries are dropped as they are found, then the least recently used."""
+
+    def __init__(self, ttl, max_entries=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._flight = SingleFlight()
+        self._generation = 0
+
+    def get(self, key, loader):
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            if self.max_entries:
+                with self._lock:
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+            return entry[1]
+        return self._flight.do(key, lambda: self._load(key, loader))
+
+    def _load(self, key, loader):
+        generation = self._generation
+        value = loader()
+        ttl = self.ttl(value) if callable(self.ttl) else self.ttl
+        with self._lock:
+            # A load that started before invalidate() must not bring old data back
+            if generation == self._generation and ttl > 0:
+                now = time.monotonic()
+                self._entries[key] = (now + ttl, value)
+                self._entries.move_to_end(key)
+                if self.max_entries:
+                    self._evict(now)
+            elif self.max_entries:
+                self._entries.pop(key, None)
+        return value
+
+    def _evict(self, now):
+        # Called with the lock held
+        while self._entries and next(iter(self._entries.values()))[0] <= now:
+            self._entries.popitem(last=False)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, *keys):
+        with self._lock:
+            self._generation += 1
+            if not keys:
+                self._entries.clear()
+            for key in keys:
+                self._entries.pop(key, None)
+        if not keys:
+            self._flight.forget()
+        for key in keys:
+            self._flight.forget(key)
+
+
+def entry_size(value):
+    if hasattr(value, "ByteSize"):
+        return value.ByteSize()
+    return sys.getsizeof(value)
+
+
+class UserCache:
+    """LRU of per-user lookups keyed by capy_uuid. Each user holds the
+    responses of several methods, bounded by TTL, user count and bytes."""
+
+    def __init__(self, ttl, max_users, max_bytes):
+        self.ttl = ttl
+        self.max_users = max_users
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._users = OrderedDict()
+        self._flight = SingleFlight()
+        # capy_uuid -> tokens of the loads in flight; invalidating a user drops
+        # them, so only that user's loads are kept from being stored
+        self._pending = {}
+
+    def get(self, capy_uuid, name, loader, cacheable=None):
+        with self._lock:
+            entry = self._users.get(capy_uuid, {}).get(name)
+            if entry is not None and entry[0] > time.monotonic():
+                self._users.move_to_end(capy_uuid)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        return self._flight.do((capy_uuid, name), lambda: self._load(capy_uuid, name, loader, cacheable))
+
+    def _finish(self, capy_uuid, token):
+        # Called with the lock held; tells whether the load is still current
+        pending = self._pending.get(capy_uuid)
+        if pending is None or token not in pending:
+            return False
+        pending.discard(token)
+        if not pending:
+            del self._pending[capy_uuid]
+        return True
+
+    def _load(self, capy_uuid, name, loader, cacheable):
+        token = object()
+        with self._lock:
+            self._pending.setdefault(capy_uuid, set()).add(token)
+        try:
+            value = loader()
+        except BaseException:
+            with self._lock:
+                self._finish(capy_uuid, token)
+            raise
+        store = cacheable is None or cacheable(value)
+        size = entry_size(value) if store else 0
+        with self._lock:
+            if not self._finish(capy_uuid, token) or not store or size > self.max_bytes:
+                return value
+            entries = self._users.setdefault(capy_uuid, {})
+            old = entries.get(name)
+            if old is not None:
+                self.size -= old[2]
+            entries[name] = (time.monotonic() + self.ttl, value, size)
+            self.size += size
+            self._users.move_to_end(capy_uuid)
+            while len(self._users) > self.max_users or self.size > self.max_bytes:
+                _, evicted = self._users.popitem(last=False)
+                self.size -= sum(entry[2] for entry in evicted.values())
+                self.evictions += 1
+        return value
+
+    def invalidate(self, capy_uuid=None):
+        with self._lock:
+            if capy_uuid is None:
+                self._pending.clear()
+                self._users.clear()
+                self.size = 0
+            else:
+                self._pending.pop(capy_uuid, None)
+                entries = self._users.pop(capy_uuid, {})
+                self.size -= sum(entry[2] for entry in entries.values())
+        if capy_uuid is None:
+            self._flight.forget()
+        else:
+            self._flight.forget_where(lambda key: key[0] == capy_uuid)
+
+    def stats(self):
+        return {
+            "users": len(self._users),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
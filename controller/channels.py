@@ -0,0 +1,174 @@
+import itertools
+import logging
+import os
+import threading
+
+import grpc
+from grpc_health.v1 import health_pb2, health_pb2_grpc
+
+from controller.interceptors import InFlightInterceptor
+
+# A stock gRPC server accepts at most one ping per 5 minutes and none while
+# no call is active, and answers anything more with GOAWAY too_many_pings.
+# Lower GRPC_KEEPALIVE_TIME_MS or set GRPC_KEEPALIVE_WITHOUT_CALLS only together
+# with grpc.http2.min_ping_interval_without_data_ms and
+# grpc.keepalive_permit_without_calls on the backends.
+CHANNEL_OPTIONS = [
+    ("grpc.keepalive_time_ms", int(os.getenv("GRPC_KEEPALIVE_TIME_MS", 300000))),
+    ("grpc.keepalive_timeout_ms", int(os.getenv("GRPC_KEEPALIVE_TIMEOUT_MS", 10000))),
+    ("grpc.keepalive_permit_without_calls", int(os.getenv("GRPC_KEEPALIVE_WITHOUT_CALLS", 0))),
+    ("grpc.http2.max_pings_without_data", 0),
+    # Without a local pool every channel to a target shares one connection
+    ("grpc.use_local_subchannel_pool", 1),
+]
+GRPC_POOL_SIZE = int(os.getenv("GRPC_POOL_SIZE", 2))
+HEALTH_CHECK_INTERVAL = float(os.getenv("GRPC_HEALTH_CHECK_INTERVAL", 10))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("GRPC_HEALTH_CHECK_TIMEOUT", 1))
+# gRPC reconnects a failing channel with backoff by itself; a channel is only
+# replaced after this many health checks in a row found it unavailable
+HEALTH_CHECK_REPLACE_AFTER = int(os.getenv("GRPC_HEALTH_CHECK_REPLACE_AFTER", 6))
+
+in_flight = InFlightInterceptor()
+stubs = []
+
+
+def service_target(name):
+    return f"{os.getenv(f'{name}_SERVICE_HOST')}:{os.getenv(f'{name}_SERVICE_PORT')}"
+
+
+class Slot:
+    def __init__(self, target, interceptors, stub_class, healthy=True):
+        self.channel = grpc.insecure_channel(target, options=CHANNEL_OPTIONS)
+        # Calls on this channel, so a replaced one is closed only once they end
+        self.calls = InFlightInterceptor()
+        self.stub = stub_class(grpc.intercept_channel(self.channel, *interceptors, self.calls))
+        self.healthy = healthy
+        self.failures = 0
+
+
+class PooledStub:
+    """Stands in for a generated stub. Every process opens its own pool of
+    ``size`` channels to the backend on first use and spreads calls over them
+    round-robin. gRPC channels must not cross a fork, so an app preloaded by
+    gunicorn only gets real channels inside the workers.
+
+    All channels of a pool share one set of interceptors, so circuit breaking
+    and coalescing still see the backend as a whole."""
+
+    def __init__(self, stub_class, name, make_interceptors, size=None):
+        self.stub_class = stub_class
+        self.name = name
+        self.make_interceptors = make_interceptors
+        self.size = size or int(os.getenv(f"{name}_GRPC_POOL_SIZE", GRPC_POOL_SIZE))
+        self._pid = None
+        self._target = None
+        self._interceptors = []
+        self._slots = []
+        self._retired = []
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+        stubs.append(self)
+
+    def _slot(self, healthy=True):
+        return Slot(self._target, self._interceptors, self.stub_class, healthy)
+
+    def _current(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._target = service_target(self.name)
+                    self._interceptors = self.make_interceptors(self.name)
+                    self._slots = [self._slot() for _ in range(self.size)]
+                    self._pid = pid
+            start_health_checks()
+        slots = self._slots
+        for _ in range(len(slots)):
+            slot = slots[next(self._next) % len(slots)]
+            if slot.healthy:
+                return slot.stub
+        # Nothing is known to be healthy, let the circuit breaker decide
+        return slot.stub
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self._current(), name)
+
+    def check_health(self):
+        if self._pid != os.getpid():
+            return
+        for index, slot in enumerate(list(self._slots)):
+            try:
+                res = health_pb2_grpc.HealthStub(slot.channel).Check(
+                    health_pb2.HealthCheckRequest(), timeout=HEALTH_CHECK_TIMEOUT)
+                slot.healthy = res.status == health_pb2.HealthCheckResponse.SERVING
+                slot.failures = 0
+            except grpc.RpcError as e:
+                if e.code() == grpc.StatusCode.UNIMPLEMENTED:
+                    # The backend has no health service, but the connection answered
+                    slot.healthy = True
+                    slot.failures = 0
+                    continue
+                slot.healthy = False
+                if e.code() != grpc.StatusCode.UNAVAILABLE:
+                    continue
+                slot.failures += 1
+                if slot.failures >= HEALTH_CHECK_REPLACE_AFTER:
+                    logging.warning("[ | CHANNELS ] - %s channel %s is broken, reconnecting", self.name, index)
+                    with self._lock:
+                        self._slots[index] = self._slot(healthy=False)
+                        self._retired.append(slot)
+        self._close_retired()
+
+    def _close_retired(self, timeout=0):
+        with self._lock:
+            retired, self._retired = self._retired, []
+        for slot in retired:
+            if slot.calls.wait_idle(timeout):
+                slot.channel.close()
+            else:
+                with self._lock:
+                    self._retired.append(slot)
+
+    def close(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                for slot in self._slots + self._retired:
+                    slot.channel.close()
+            self._pid = None
+            self._slots = []
+            self._retired = []
+
+
+_health_pid = None
+_health_lock = threading.Lock()
+_health_stop = threading.Event()
+
+
+def health_loop():
+    while not _health_stop.wait(HEALTH_CHECK_INTERVAL):
+        for stub in stubs:
+            stub.check_health()
+
+
+# One checker thread per process, started with the first pool
+def start_health_checks():
+    global _health_pid
+    if HEALTH_CHECK_INTERVAL <= 0:
+        return
+    with _health_lock:
+        if _health_pid == os.getpid():
+            return
+        _health_pid = os.getpid()
+        _health_stop.clear()
+        threading.Thread(target=health_loop, name="grpc-health", daemon=True).start()
+
+
+# Called on worker exit: lets in-flight backend calls finish, then closes channels
+def drain(timeout):
+    _health_stop.set()
+    if not in_flight.wait_idle(timeout):
+        logging.warning("[ | CHANNELS ] - %s gRPC calls still running after %ss", in_flight.count, timeout)
+    for stub in stubs:
+        stub.close()
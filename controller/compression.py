@@ -0,0 +1,92 @@
+import gzip
+import os
+import threading
+from collections import OrderedDict
+
+from flask import request
+
+from controller.http_cache import CONTENT_ENCODINGS, encoded_etag, etag_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", 6))
+COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", 5))
+COMPRESS_CACHE_BYTES = int(os.getenv("COMPRESS_CACHE_BYTES", 8 * 1024 * 1024))
+COMPRESS_MIMETYPES = {"application/json", "text/html", "text/plain", "text/css", "application/javascript"}
+
+ENCODERS = {"gzip": lambda data: gzip.compress(data, COMPRESS_GZIP_LEVEL, mtime=0)}
+if brotli is not None:
+    ENCODERS["br"] = lambda data: brotli.compress(data, quality=COMPRESS_BROTLI_QUALITY)
+# Preferred first when the client accepts several with the same q-value
+ENCODINGS = [encoding for encoding in CONTENT_ENCODINGS if encoding in ENCODERS]
+
+
+class CompressedCache:
+    """LRU of compressed bodies keyed by (body hash, encoding), bounded in
+    bytes. Cached payloads serialize to the same body on every hit, so they
+    are compressed once."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key, compress):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                return data
+        data = compress()
+        if len(data) > self.max_bytes:
+            return data
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = data
+                self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+compressed_cache = CompressedCache(COMPRESS_CACHE_BYTES)
+
+
+def compress_response(response):
+    # A 304 has no body (nor Content-Type) but must vary like the 200 it stands for
+    if response.status_code == 304 and response.get_etag()[0]:
+        response.vary.add("Accept-Encoding")
+    if response.mimetype not in COMPRESS_MIMETYPES or response.is_streamed:
+        return response
+    response.vary.add("Accept-Encoding")
+    if response.status_code != 200 or "Content-Encoding" in response.headers:
+        return response
+    encoding = request.accept_encodings.best_match(ENCODINGS)
+    if encoding is None:
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+    etag, weak = response.get_etag()
+    data = compressed_cache.get((etag or etag_for(body), encoding), lambda: ENCODERS[encoding](body))
+    response.set_data(data)
+    response.headers["Content-Encoding"] = encoding
+    # The compressed bytes are a different representation, so they get their own tag
+    if etag:
+        response.set_etag(encoded_etag(etag, encoding), weak)
+    return response
+
+
+def init_compression(app):
+    app.after_request(compress_response)
@@ -0,0 +1,49 @@
+import functools
+import hashlib
+
+from flask import make_response, request
+
+# Content codings the gateway may apply, best first (see compression.py)
+CONTENT_ENCODINGS = ("br", "gzip")
+
+
+def etag_for(body):
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+# A compressed representation is tagged with its encoding appended
+def encoded_etag(etag, encoding):
+    return f"{etag}-{encoding}"
+
+
+def not_modified(response, etag):
+    response.set_data(b"")
+    response.status_code = 304
+    response.set_etag(etag)
+    # A 304 carries no body, so the entity headers of the full one go away
+    for header in ("Content-Type", "Content-Length"):
+        response.headers.pop(header, None)
+    return response
+
+
+# Adds an ETag (a hash of the body, so of the backend answer it was built
+# from) and the given Cache-Control to successful responses of the view, and
+# answers a matching If-None-Match with an empty 304.
+def conditional(cache_control):
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            response.headers["Cache-Control"] = cache_control
+            if "private" in cache_control:
+                response.vary.add("Cookie")
+            etag = etag_for(response.get_data())
+            for tag in (etag, *(encoded_etag(etag, encoding) for encoding in CONTENT_ENCODINGS)):
+                if request.if_none_match.contains_weak(tag):
+                    return not_modified(response, tag)
+            response.set_etag(etag)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,62 @@
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+# The first size is the avatar itself, the rest are stored as {name}_{size}.webp
+AVATAR_SIZES = [int(size) for size in os.getenv("AVATAR_SIZES", "512,128").split(",")]
+AVATAR_QUALITY = int(os.getenv("AVATAR_QUALITY", 80))
+AVATAR_MAX_UPLOAD_SIZE = int(os.getenv("AVATAR_MAX_UPLOAD_SIZE", 10 * 1024 * 1024))
+AVATAR_MAX_PIXELS = int(os.getenv("AVATAR_MAX_PIXELS", 40_000_000))
+
+# Decoding is the memory-heavy part, so the pool size bounds how many
+# uploads hold a decoded bitmap at the same time
+image_executor = ThreadPoolExecutor(max_workers=int(os.getenv("AVATAR_WORKERS", 2)),
+                                    thread_name_prefix="avatar")
+
+
+def read_limited(chunks, limit):
+    """The chunks joined, or None once they go past ``limit`` bytes."""
+    buffer = bytearray()
+    for piece in chunks:
+        buffer += piece
+        if len(buffer) > limit:
+            return None
+    return buffer
+
+
+def iter_chunks(data, size):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def encode_webp(image):
+    output = io.BytesIO()
+    image.save(output, "WEBP", quality=AVATAR_QUALITY, method=4)
+    return output.getvalue()
+
+
+# Returns [(size, webp bytes)] in AVATAR_SIZES order, or None for anything
+# that is not a decodable image within the pixel limit
+def normalize_avatar(data):
+    largest = max(AVATAR_SIZES)
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if image.width * image.height > AVATAR_MAX_PIXELS:
+                return None
+            # Lets JPEG decode straight at a reduced scale
+            image.draft("RGB", (largest, largest))
+            image = ImageOps.exif_transpose(image)
+            has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha else "RGB")
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+    side = min(image.width, image.height)
+    results = {}
+    for size in sorted(set(AVATAR_SIZES), reverse=True):
+        target = min(size, side)
+        image = ImageOps.fit(image, (target, target), method=Image.LANCZOS)
+        results[size] = encode_webp(image)
+    return [(size, results[size]) for size in AVATAR_SIZES]
@@ -0,0 +1,292 @@
+import random
+import threading
+import time
+from collections import namedtuple
+
+import grpc
+
+from controller.cache import SingleFlight
+
+
+def method_name(client_call_details):
+    return client_call_details.method.rsplit("/", 1)[-1]
+
+
+class CoalescingInterceptor(grpc.UnaryUnaryClientInterceptor):
+    """Concurrent blocking calls with the same method and the same serialized
+    request share one upstream call. Only ``methods`` are coalesced, so
+    mutating calls always reach the backend."""
+
+    def __init__(self, methods):
+        self.methods = frozenset(methods)
+        self._flight = SingleFlight()
+
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        if method_name(client_call_details) not in self.methods:
+            return continuation(client_call_details, request)
+        key = (client_call_details.method, request.SerializeToString(deterministic=True))
+        return self._flight.do(key, lambda: continuation(client_call_details, request))
+
+
+class ClientCallDetails(namedtuple("ClientCallDetails", ["method", "timeout", "metadata", "credentials",
+                                                         "wait_for_ready", "compression"]),
+                        grpc.ClientCallDetails):
+    pass
+
+
+def with_details(client_call_details, **changes):
+    return ClientCallDetails(
+        client_call_details.method, client_call_details.timeout, client_call_details.metadata,
+        client_call_details.credentials, client_call_details.wait_for_ready, client_call_details.compression,
+    )._replace(**changes)
+
+
+class DeadlineInterceptor(grpc.UnaryUnaryClientInterceptor, grpc.StreamUnaryClientInterceptor):
+    """Sets a timeout on every call that was made without one."""
+
+    def __init__(self, default, per_method=None):
+        self.default = default
+        self.per_method = per_method or {}
+
+    def _details(self, client_call_details):
+        if client_call_details.timeout is not None:
+            return client_call_details
+        timeout = self.per_method.get(method_name(client_call_details), self.default)
+        return with_details(client_call_details, timeout=timeout)
+
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        return continuation(self._details(client_call_details), request)
+
+    def intercept_stream_unary(self, continuation, client_call_details, request_iterator):
+        return continuation(self._details(client_call_details), request_iterator)
+
+
+class RetryBudget:
+    """Every call earns ``ratio`` of a retry and every retry spends a whole
+    one, so retries stay a bounded share of traffic while a backend is down."""
+
+    def __init__(self, ratio, max_tokens):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+RETRYABLE_CODES = {grpc.StatusCode.UNAVAILABLE}
+
+
+class RetryInterceptor(grpc.UnaryUnaryClientInterceptor):
+    """Retries idempotent ``methods`` with jittered exponential backoff while
+    the shared budget allows it."""
+
+    def __init__(self, methods, budget, attempts=3, backoff=0.05):
+        self.methods = frozenset(methods)
+        self.budget = budget
+        self.attempts = attempts
+        self.backoff = backoff
+
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        # All attempts share the call's timeout, a retry only gets what is left
+        timeout = client_call_details.timeout
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        call = continuation(client_call_details, request)
+        if method_name(client_call_details) not in self.methods:
+            return call
+        self.budget.deposit()
+        attempt = 1
+        # Futures that are still running are handed back untouched
+        while call.done() and call.code() in RETRYABLE_CODES and attempt < self.attempts:
+            delay = self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+            details = client_call_details
+            if deadline is not None:
+                remaining = deadline - time.monotonic() - delay
+                if remaining <= 0:
+                    break
+                details = with_details(client_call_details, timeout=remaining)
+            if not self.budget.withdraw():
+                break
+            time.sleep(delay)
+            call = continuation(details, request)
+            attempt += 1
+        return call
+
+
+# A call rejected by the gateway itself. Behaves like the error grpc returns
+# for a failed call, so outer interceptors and callers can treat it as a
+# finished call
+class RejectedCall(grpc.RpcError, grpc.Call, grpc.Future):
+    status_code = grpc.StatusCode.UNAVAILABLE
+
+    def __init__(self, service):
+        super().__init__()
+        self.service = service
+
+    def code(self):
+        return self.status_code
+
+    def details(self):
+        return f"{self.service} service is unavailable"
+
+    def initial_metadata(self):
+        return None
+
+    def trailing_metadata(self):
+        return None
+
+    def is_active(self):
+        return False
+
+    def time_remaining(self):
+        return None
+
+    def cancel(self):
+        return False
+
+    def cancelled(self):
+        return False
+
+    def running(self):
+        return False
+
+    def done(self):
+        return True
+
+    def result(self, timeout=None):
+        raise self
+
+    def exception(self, timeout=None):
+        return self
+
+    def traceback(self, timeout=None):
+        return None
+
+    def add_callback(self, callback):
+        return False
+
+    def add_done_callback(self, fn):
+        fn(self)
+
+
+class CircuitOpenError(RejectedCall):
+    pass
+
+
+class OverloadedError(RejectedCall):
+    status_code = grpc.StatusCode.RESOURCE_EXHAUSTED
+
+    def details(self):
+        return f"too many concurrent calls to {self.service}"
+
+
+FAILURE_CODES = {grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED}
+
+
+class CircuitBreakerInterceptor(grpc.UnaryUnaryClientInterceptor, grpc.StreamUnaryClientInterceptor):
+    """Opens after ``threshold`` consecutive failures of one backend and
+    rejects calls at once for ``reset_timeout`` seconds, then lets a single
+    trial call decide whether to close again."""
+
+    def __init__(self, service, threshold=5, reset_timeout=10):
+        self.service = service
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def _allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def _record(self, call):
+        with self._lock:
+            self._trial = False
+            # Cancelled on purpose (e.g. a stale search), says nothing about the backend
+            if call.code() == grpc.StatusCode.CANCELLED:
+                return
+            if call.code() in FAILURE_CODES:
+                self.failures += 1
+                if self.opened_at is not None or self.failures >= self.threshold:
+                    self.opened_at = time.monotonic()
+            else:
+                self.failures = 0
+                self.opened_at = None
+
+    def _call(self, invoke):
+        if not self._allow():
+            raise CircuitOpenError(self.service)
+        try:
+            call = invoke()
+        except Exception:
+            with self._lock:
+                self._trial = False
+            raise
+        call.add_done_callback(self._record)
+        return call
+
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        return self._call(lambda: continuation(client_call_details, request))
+
+    def intercept_stream_unary(self, continuation, client_call_details, request_iterator):
+        return self._call(lambda: continuation(client_call_details, request_iterator))
+
+
+class InFlightInterceptor(grpc.UnaryUnaryClientInterceptor, grpc.StreamUnaryClientInterceptor):
+    """Counts calls that have not finished yet, so shutdown can wait for them."""
+
+    def __init__(self):
+        self.count = 0
+        self._idle = threading.Condition()
+
+    def _finished(self, call=None):
+        with self._idle:
+            self.count -= 1
+            if self.count == 0:
+                self._idle.notify_all()
+
+    def _track(self, invoke):
+        with self._idle:
+            self.count += 1
+        try:
+            call = invoke()
+        except Exception:
+            self._finished()
+            raise
+        call.add_done_callback(self._finished)
+        return call
+
+    def wait_idle(self, timeout):
+        with self._idle:
+            return self._idle.wait_for(lambda: self.count == 0, timeout)
+
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        return self._track(lambda: continuation(client_call_details, request))
+
+    def intercept_stream_unary(self, continuation, client_call_details, request_iterator):
+        return self._track(lambda: continuation(client_call_details, request_iterator))
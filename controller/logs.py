@@ -0,0 +1,128 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import request
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Share of INFO records that are written, WARNING and above are always kept
+LOG_INFO_SAMPLE_RATE = float(os.getenv("LOG_INFO_SAMPLE_RATE", 1))
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class ContextFilter(logging.Filter):
+    """Stamps the record with the current request ID and drops all but
+    ``info_rate`` of INFO records."""
+
+    def __init__(self, info_rate=1):
+        super().__init__()
+        self.info_rate = info_rate
+
+    def filter(self, record):
+        if record.levelno == logging.INFO and self.info_rate < 1 and random.random() >= self.info_rate:
+            return False
+        record.request_id = request_id.get()
+        return True
+
+
+class BackgroundHandler(QueueHandler):
+    """Hands records to a listener thread that formats and writes them, so
+    request threads never wait on stdout. The thread does not survive a fork,
+    so every process starts its own on first use."""
+
+    def __init__(self, handler):
+        super().__init__(queue.SimpleQueue())
+        self.handler = handler
+        self._pid = None
+        self._listener = None
+
+    def prepare(self, record):
+        # Formatting is left to the listener, only pin down what can't wait
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            # The handler's lock is reinitialized by logging after a fork, so
+            # two threads of a new worker can't both start a listener
+            with self.lock:
+                if self._pid != os.getpid():
+                    # Records copied over from the parent's queue were already written there
+                    self.queue = queue.SimpleQueue()
+                    self._listener = QueueListener(self.queue, self.handler, respect_handler_level=True)
+                    self._listener.start()
+                    self._pid = os.getpid()
+        self.queue.put_nowait(record)
+
+    def close(self):
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+        super().close()
+
+
+def configure_logging(level=LOG_LEVEL, info_rate=LOG_INFO_SAMPLE_RATE, stream=sys.stdout):
+    output = logging.StreamHandler(stream)
+    output.setFormatter(JsonFormatter())
+    handler = BackgroundHandler(output)
+    handler.addFilter(ContextFilter(info_rate))
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+    atexit.register(handler.close)
+    return handler
+
+
+def start_request():
+    request_id.set(request.headers.get("X-Request-ID", "")[:64] or uuid.uuid4().hex)
+
+
+def tag_response(response):
+    if request_id.get():
+        response.headers["X-Request-ID"] = request_id.get()
+    return response
+
+
+def end_request(exc):
+    request_id.set(None)
+
+
+def init_logging(app):
+    configure_logging()
+    app.before_request(start_request)
+    app.after_request(tag_response)
+    app.teardown_request(end_request)
@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+
+import grpc
+from flask import Response, g, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+
+from controller.interceptors import method_name
+
+REQUEST_COUNT = Counter("controller_http_requests_total", "HTTP requests handled",
+                        ["endpoint", "method", "status"])
+REQUEST_LATENCY = Histogram("controller_http_request_duration_seconds", "HTTP request latency",
+                            ["endpoint", "method"])
+RPC_COUNT = Counter("controller_grpc_client_calls_total", "Backend gRPC calls by status code",
+                    ["service", "method", "code"])
+RPC_LATENCY = Histogram("controller_grpc_client_duration_seconds", "Backend gRPC call latency",
+                        ["service", "method"])
+RPC_IN_FLIGHT = Gauge("controller_grpc_client_in_flight", "Backend gRPC calls in progress",
+                      ["service"], multiprocess_mode="livesum")
+BULKHEAD_LIMIT = Gauge("controller_bulkhead_limit", "Concurrent calls a backend bulkhead allows",
+                       ["service"], multiprocess_mode="livesum")
+BULKHEAD_ACTIVE = Gauge("controller_bulkhead_active", "Calls holding a bulkhead slot",
+                        ["service"], multiprocess_mode="livesum")
+BULKHEAD_QUEUED = Gauge("controller_bulkhead_queued", "Calls waiting for a bulkhead slot",
+                        ["service"], multiprocess_mode="livesum")
+BULKHEAD_REJECTED = Counter("controller_bulkhead_rejected_total", "Calls rejected by a full bulkhead",
+                            ["service"])
+
+
+class MetricsInterceptor(grpc.UnaryUnaryClientInterceptor, grpc.StreamUnaryClientInterceptor):
+    def __init__(self, service):
+        self.service = service
+
+    def _observe(self, client_call_details, invoke):
+        method = method_name(client_call_details)
+        in_flight = RPC_IN_FLIGHT.labels(self.service)
+        in_flight.inc()
+        start = time.perf_counter()
+
+        def done(call):
+            in_flight.dec()
+            RPC_LATENCY.labels(self.service, method).observe(time.perf_counter() - start)
+            code = call.code()
+            RPC_COUNT.labels(self.service, method, code.name if code else "UNKNOWN").inc()
+
+        try:
+            call = invoke()
+        except Exception as e:
+            in_flight.dec()
+            code = e.code() if isinstance(e, grpc.Call) else None
+            RPC_COUNT.labels(self.service, method, code.name if code else "UNKNOWN").inc()
+            raise
+        call.add_done_callback(done)
+        return call
+
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        return self._observe(client_call_details, lambda: continuation(client_call_details, request))
+
+    def intercept_stream_unary(self, continuation, client_call_details, request_iterator):
+        return self._observe(client_call_details, lambda: continuation(client_call_details, request_iterator))
+
+
+class CacheMetrics:
+    """Exposes a cache's stats() as counters and gauges. The values are
+    copied over after every request rather than read at scrape time, so
+    under gunicorn the merged multiprocess scrape has every worker's cache,
+    not only the one of the worker that answered it."""
+
+    COUNTERS = ("hits", "misses", "evictions")
+    GAUGES = ("users", "bytes")
+
+    def __init__(self, name, cache):
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._seen = dict.fromkeys(self.COUNTERS, 0)
+        self._counters = {key: Counter(f"controller_{name}_{key}", f"{name} {key}") for key in self.COUNTERS}
+        self._gauges = {key: Gauge(f"controller_{name}_{key}", f"{name} {key}", multiprocess_mode="livesum")
+                        for key in self.GAUGES}
+        CACHE_METRICS.append(self)
+
+    def sync(self):
+        stats = self.cache.stats()
+        with self._lock:
+            for key, counter in self._counters.items():
+                if stats[key] > self._seen[key]:
+                    counter.inc(stats[key] - self._seen[key])
+                    self._seen[key] = stats[key]
+            for key, gauge in self._gauges.items():
+                gauge.set(stats[key])
+
+
+CACHE_METRICS = []
+
+
+def sync_cache_metrics():
+    for cache_metrics in CACHE_METRICS:
+        cache_metrics.sync()
+
+
+def start_timer():
+    g.request_start = time.perf_counter()
+
+
+def record_request(response):
+    start = g.pop("request_start", None)
+    if start is not None:
+        endpoint = request.endpoint or "unmatched"
+        REQUEST_LATENCY.labels(endpoint, request.method).observe(time.perf_counter() - start)
+        REQUEST_COUNT.labels(endpoint, request.method, response.status_code).inc()
+    sync_cache_metrics()
+    return response
+
+
+def metrics():
+    sync_cache_metrics()
+    registry = REGISTRY
+    # Under gunicorn every worker writes its own files, the scrape merges them
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_metrics(app):
+    app.before_request(start_timer)
+    app.after_request(record_request)
+    app.add_url_rule("/metrics", "metrics", metrics)
@@ -0,0 +1,115 @@
+import functools
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import request
+
+from controller.utils import too_many_requests
+
+# Per-route overrides of the limits given in code, e.g. "vote=1:5,login=0.5:10"
+# (tokens per second : burst)
+RATE_LIMITS = {
+    name: tuple(float(part) for part in limit.split(":"))
+    for name, limit in (item.split("=") for item in os.getenv("RATE_LIMITS", "").split(",") if item)
+}
+# Shared buckets for every worker and replica; in-process buckets when unset
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+
+
+class MemoryStore:
+    """Token buckets for this process, least recently used first. Once there
+    are more than ``max_keys``, the oldest buckets are dropped."""
+
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def take(self, key, rate, burst):
+        """Takes a token from ``key``'s bucket; returns 0 on success or the
+        seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class RedisStore:
+    """The same token buckets kept in Redis, updated atomically by a script."""
+
+    SCRIPT = """
+    local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated")
+    local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local tokens = math.min(burst, (tonumber(bucket[1]) or burst) + (now - (tonumber(bucket[2]) or now)) * rate)
+    local wait = 0
+    if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+    redis.call("HSET", KEYS[1], "tokens", tokens, "updated", now)
+    redis.call("EXPIRE", KEYS[1], math.ceil(burst / rate) + 1)
+    return tostring(wait)
+    """
+
+    def __init__(self, client, prefix="ratelimit:"):
+        self.prefix = prefix
+        self._script = client.register_script(self.SCRIPT)
+
+    def take(self, key, rate, burst):
+        return float(self._script(keys=[self.prefix + key], args=[rate, burst, time.time()]))
+
+
+def make_store():
+    if RATE_LIMIT_REDIS_URL:
+        import redis
+        return RedisStore(redis.Redis.from_url(RATE_LIMIT_REDIS_URL))
+    return MemoryStore(RATE_LIMIT_MAX_KEYS)
+
+
+store = make_store()
+
+
+# Cookies are set by the client and cost nothing to change, so buckets are
+# per address (behind proxies, remote_addr comes from ProxyFix, see PROXY_FIX_HOPS)
+def client_key():
+    return request.remote_addr or "-"
+
+
+def body_key(field):
+    """Keys buckets by address and the account named by ``field`` in the
+    JSON body: guessing one account's password or code stays limited, while
+    one address doesn't lock out everyone else behind it."""
+    def key():
+        body = request.get_json(silent=True)
+        value = body.get(field) if isinstance(body, dict) else None
+        return f"{client_key()}:{value if isinstance(value, str) else ''}"
+    return key
+
+
+def rate_limit(name, rate, burst, key=client_key):
+    """Lets each client call the view ``rate`` times per second on average,
+    ``burst`` at once, and answers the rest with 429 and Retry-After."""
+    rate, burst = RATE_LIMITS.get(name, (rate, burst))
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            wait = store.take(f"{name}:{key()}", rate, burst)
+            if wait:
+                return too_many_requests(), 429, {"Retry-After": str(math.ceil(wait))}
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,75 @@
+from flask import request
+
+
+class RpcRoute:
+    """An endpoint that is one RPC: the request message is built from the
+    caller's uuid cookie and JSON body fields, the reply is mapped to JSON.
+
+    ``rpc`` may contain ``{kind}``, which becomes "Tmp" for a tmp-uuid caller
+    and "Capy" for a capy-uuid one (tmp-uuid wins, as in the hand-written
+    views). With ``uuid_field`` set, callers without either cookie get
+    ``unauthorized``. ``body`` maps request fields to JSON keys that must be
+    present, otherwise the answer is ``missing``. ``on_success`` hooks run
+    after a status 0 reply, ``decorators`` wrap the view."""
+
+    def __init__(self, path, rpc, request_class, response, methods=("GET",), uuid_field=None, body=None,
+                 unauthorized=None, missing=None, on_success=(), decorators=(), endpoint=None):
+        self.path = path
+        self.rpc = rpc
+        self.request_class = request_class
+        self.response = response
+        self.methods = list(methods)
+        self.uuid_field = uuid_field
+        self.body = dict(body or {})
+        self.unauthorized = unauthorized
+        self.missing = missing
+        self.on_success = tuple(on_success)
+        self.decorators = tuple(decorators)
+        self.endpoint = endpoint or path.strip("/").replace("/", "_")
+        # Checked here so a bad table entry fails at startup, not on a request
+        if self.body and missing is None:
+            raise ValueError(f"{path}: a route with body fields needs a missing response")
+        if uuid_field and unauthorized is None:
+            raise ValueError(f"{path}: a route with uuid_field needs an unauthorized response")
+
+
+def make_view(route, stub):
+    # Everything that doesn't depend on the request is worked out here, once
+    rpc_names = {kind: route.rpc.format(kind=kind) for kind in ("Tmp", "Capy")}
+    uuid_field, body_items, request_class = route.uuid_field, tuple(route.body.items()), route.request_class
+    render, on_success = route.response, route.on_success
+
+    def view():
+        fields = {}
+        rpc = rpc_names["Tmp"]
+        if uuid_field:
+            tmp_uuid = request.cookies.get("tmp-uuid")
+            capy_uuid = request.cookies.get("capy-uuid")
+            if not tmp_uuid and not capy_uuid:
+                return dict(route.unauthorized)
+            fields[uuid_field] = tmp_uuid or capy_uuid
+            rpc = rpc_names["Tmp" if tmp_uuid else "Capy"]
+        if body_items:
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict):
+                return dict(route.missing)
+            for field, key in body_items:
+                value = data.get(key)
+                if not value:
+                    return dict(route.missing)
+                fields[field] = value
+        res = getattr(stub, rpc)(request_class(**fields))
+        if res.status == 0:
+            for hook in on_success:
+                hook()
+        return render(res)
+
+    view.__name__ = route.endpoint
+    for decorator in reversed(route.decorators):
+        view = decorator(view)
+    return view
+
+
+def register_routes(blueprint, stub, routes):
+    for route in routes:
+        blueprint.add_url_rule(route.path, route.endpoint, make_view(route, stub), methods=route.methods)
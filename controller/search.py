@@ -0,0 +1,191 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import grpc
+import user_service.user_service_pb2 as user_pb2
+
+from controller import user_service_stub
+from controller.metrics import CacheMetrics
+from controller.serialization import PEER
+
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", 10))
+SEARCH_CACHE_MAX_USERS = int(os.getenv("SEARCH_CACHE_MAX_USERS", 10000))
+# Queries kept per user, one per keystroke of each nickname typed
+SEARCH_CACHE_MAX_QUERIES = int(os.getenv("SEARCH_CACHE_MAX_QUERIES", 32))
+# If user_service caps the number of results, a capped answer can't be
+# narrowed down locally. 0 means it always returns every match.
+SEARCH_RESULT_LIMIT = int(os.getenv("SEARCH_RESULT_LIMIT", 0))
+
+SECTIONS = ("friends", "on_platform", "out_platform")
+
+
+def normalize(nickname):
+    return nickname.casefold()
+
+
+def narrow(data, query):
+    return {section: [user for user in data[section] if normalize(user["nickname"]).startswith(query)]
+            for section in SECTIONS}
+
+
+class PendingSearch:
+    """A user's search in flight. It can be cancelled before its backend
+    call has started; the call is then cancelled as soon as it starts."""
+
+    def __init__(self):
+        self.future = None
+        self.cancelled = False
+        self._lock = threading.Lock()
+
+    def start(self, future):
+        with self._lock:
+            self.future = future
+            cancelled = self.cancelled
+        if cancelled:
+            future.cancel()
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            future = self.future
+        if future is not None:
+            future.cancel()
+
+
+class SearchCache:
+    """Type-ahead results per user, keyed by (capy_uuid, query). A query
+    that extends a cached one is answered by filtering the cached result, and
+    a new backend search cancels the user's previous one still in flight."""
+
+    def __init__(self, ttl, max_users, result_limit=0, max_queries=32):
+        self.ttl = ttl
+        self.max_users = max_users
+        self.max_queries = max_queries
+        self.result_limit = result_limit
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._users = OrderedDict()
+        self._pending = {}
+        self._generation = 0
+
+    def _lookup(self, capy_uuid, query):
+        entries = self._users.get(capy_uuid)
+        if not entries:
+            return None
+        now = time.monotonic()
+        for length in range(len(query), 0, -1):
+            entry = entries.get(query[:length])
+            if entry is None or entry[0] <= now:
+                continue
+            description, data = entry[1:]
+            if length == len(query):
+                return description, data
+            if self.result_limit and sum(len(data[section]) for section in SECTIONS) >= self.result_limit:
+                return None
+            return description, narrow(data, query)
+        return None
+
+    def search(self, capy_uuid, nickname, fetch):
+        """``fetch(nickname)`` starts the backend call and returns a future of
+        ``(status, description, data)``; only status 0 answers are cached."""
+        query = normalize(nickname)
+        with self._lock:
+            cached = self._lookup(capy_uuid, query)
+            if cached is not None:
+                self._users.move_to_end(capy_uuid)
+                self.hits += 1
+                return (0, *cached)
+            self.misses += 1
+            generation = self._generation
+            pending = PendingSearch()
+            stale = self._pending.get(capy_uuid)
+            self._pending[capy_uuid] = pending
+        if stale is not None:
+            stale.cancel()
+        try:
+            # Started outside the lock: the call may wait for a bulkhead slot
+            pending.start(fetch(nickname))
+            status, description, data = pending.future.result()
+        finally:
+            with self._lock:
+                if self._pending.get(capy_uuid) is pending:
+                    del self._pending[capy_uuid]
+        if status == 0:
+            self._store(capy_uuid, query, description, data, generation)
+        return status, description, data
+
+    def _store(self, capy_uuid, query, description, data, generation):
+        with self._lock:
+            if generation != self._generation:
+                return
+            now = time.monotonic()
+            entries = self._users.setdefault(capy_uuid, OrderedDict())
+            # Entries share one TTL, so the oldest ones expire first
+            while entries and next(iter(entries.values()))[0] <= now:
+                entries.popitem(last=False)
+            entries.pop(query, None)
+            entries[query] = (now + self.ttl, description, data)
+            while len(entries) > self.max_queries:
+                entries.popitem(last=False)
+                self.evictions += 1
+            self._users.move_to_end(capy_uuid)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, capy_uuid=None):
+        with self._lock:
+            self._generation += 1
+            if capy_uuid is None:
+                self._users.clear()
+            else:
+                self._users.pop(capy_uuid, None)
+
+    def stats(self):
+        return {
+            "users": len(self._users),
+            "bytes": 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class SearchFuture:
+    """Turns a search_user call future into one of (status, description, data)."""
+
+    def __init__(self, call):
+        self.call = call
+
+    def cancel(self):
+        return self.call.cancel()
+
+    def result(self):
+        res = self.call.result()
+        return res.status, res.description, {
+            "friends": PEER.many(res.friends),
+            "on_platform": PEER.many(res.on_platform),
+            "out_platform": PEER.many(res.out_platform)
+        }
+
+
+search_cache = SearchCache(SEARCH_CACHE_TTL, SEARCH_CACHE_MAX_USERS, SEARCH_RESULT_LIMIT, SEARCH_CACHE_MAX_QUERIES)
+CacheMetrics("search_cache", search_cache)
+
+
+def find_users(capy_uuid, nickname):
+    def fetch(nickname):
+        return SearchFuture(user_service_stub.search_user.future(user_pb2.SearchUserRequest(
+            capy_uuid=capy_uuid,
+            nickname=nickname
+        )))
+
+    try:
+        status, description, data = search_cache.search(capy_uuid, nickname, fetch)
+    except grpc.FutureCancelledError:
+        return {"status": 1, "description": "Запрос устарел", "data": {section: [] for section in SECTIONS}}
+    return {"status": status, "description": description, "data": data}
@@ -0,0 +1,78 @@
+import operator
+import os
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# "orjson" (when installed) or "stdlib"
+JSON_PROVIDER = os.getenv("JSON_PROVIDER", "orjson")
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask's JSON provider with orjson doing the encoding. Dates, dataclasses
+    and Markup still go through Flask's ``default`` so the output matches the
+    stdlib provider; pretty printing (debug mode) falls back to it."""
+
+    sort_keys = False
+
+    @property
+    def option(self):
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        return option | orjson.OPT_SORT_KEYS if self.sort_keys else option
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self.option).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self.option | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def init_json(app):
+    if orjson is not None and JSON_PROVIDER == "orjson":
+        app.json = OrjsonProvider(app)
+
+
+class MessageFields:
+    """Turns protobuf messages into JSON-ready dicts. ``fields`` maps output
+    keys to message attributes, or to (attribute, MessageFields) for repeated
+    message fields; the getters are built once, not per message."""
+
+    def __init__(self, **fields):
+        scalars = {key: value for key, value in fields.items() if isinstance(value, str)}
+        self.keys = tuple(scalars)
+        getter = operator.attrgetter(*scalars.values()) if scalars else lambda message: ()
+        self.getter = getter if len(scalars) != 1 else lambda message: (getter(message),)
+        self.nested = tuple((key, operator.attrgetter(value[0]), value[1])
+                            for key, value in fields.items() if not isinstance(value, str))
+
+    def __call__(self, message):
+        result = dict(zip(self.keys, self.getter(message)))
+        for key, getter, fields in self.nested:
+            result[key] = fields.many(getter(message))
+        return result
+
+    def many(self, messages):
+        if self.nested:
+            return [self(message) for message in messages]
+        keys, getter = self.keys, self.getter
+        return [dict(zip(keys, getter(message))) for message in messages]
+
+
+CANDIDATE = MessageFields(avatar="avatar", id="id", about="about", login="login")
+STATISTIC = MessageFields(nickname="nickname", count="count", percent="percent")
+PEER = MessageFields(nickname="login", avatar="avatar")
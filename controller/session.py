@@ -0,0 +1,84 @@
+import functools
+import os
+
+import grpc
+import user_service.user_service_pb2 as user_pb2
+from flask import make_response, request
+
+from controller import user_cache, user_service_stub
+from controller.cache import TTLCache
+
+
+def user_call(capy_uuid, method, req):
+    return user_cache.get(capy_uuid, method, lambda: getattr(user_service_stub, method)(req),
+                          cacheable=lambda res: res.status == 0)
+
+
+class TokenVerifier:
+    """Remembers whether a capy-uuid is a live session. Valid and rejected
+    tokens are kept for different TTLs, anything else is asked again."""
+
+    def __init__(self, ttl, negative_ttl, max_entries):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # Keyed by whatever cookie the client sends, so it has to be bounded
+        self._cache = TTLCache(self._ttl_for, max_entries)
+
+    def _ttl_for(self, valid):
+        if valid is None:
+            return 0
+        return self.ttl if valid else self.negative_ttl
+
+    # user_service answers get_rp with status 13 once the token has expired
+    def _check(self, capy_uuid):
+        res = user_call(capy_uuid, "get_rp", user_pb2.GetRpRequest(capy_uuid=capy_uuid))
+        if res.status == 13:
+            return False
+        if res.status == 0:
+            return True
+        return None
+
+    def verify(self, capy_uuid):
+        return self._cache.get(capy_uuid, lambda: self._check(capy_uuid))
+
+    def invalidate(self, capy_uuid=None):
+        if capy_uuid is None:
+            self._cache.invalidate()
+        else:
+            self._cache.invalidate(capy_uuid)
+
+
+token_verifier = TokenVerifier(ttl=float(os.getenv("SESSION_TTL", 30)),
+                               negative_ttl=float(os.getenv("SESSION_NEGATIVE_TTL", 10)),
+                               max_entries=int(os.getenv("SESSION_CACHE_MAX", 50000)))
+
+
+# Drops everything remembered about a session that ended or expired
+def forget_session(capy_uuid):
+    token_verifier.invalidate(capy_uuid)
+    user_cache.invalidate(capy_uuid)
+
+
+def expired_session_response():
+    response = make_response({"status": 13, "description": "Ваш токен устарел. Необходимо авторизоваться заново"})
+    response.set_cookie("capy-uuid", "", samesite="None", secure=True)
+    return response
+
+
+# Rejects a known-bad capy-uuid before the view talks to any backend.
+# Views keep their own handling of a missing cookie, and an unreachable
+# user_service lets the request through to fail where it did before.
+def session_required(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        capy_uuid = request.cookies.get("capy-uuid")
+        if capy_uuid:
+            try:
+                valid = token_verifier.verify(capy_uuid)
+            except grpc.RpcError:
+                valid = None
+            if valid is False:
+                user_cache.invalidate(capy_uuid)
+                return expired_session_response()
+        return view(*args, **kwargs)
+    return wrapper
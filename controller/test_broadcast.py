@@ -0,0 +1,88 @@
+import json
+import threading
+
+from controller.broadcast import Broadcaster, diff
+
+
+def state(**counts):
+    return {"data": {nickname: {"count": count} for nickname, count in counts.items()},
+            "count_voter": sum(counts.values())}
+
+
+def parse(message):
+    name, data = message.strip().split("\n")
+    return name.removeprefix("event: "), json.loads(data.removeprefix("data: "))
+
+
+def test_diff():
+    assert diff(state(capy=1, bara=2), state(capy=1, bara=2)) == {}
+    assert diff(state(capy=1, bara=2), state(capy=4, cat=1)) == {
+        "count_voter": 5, "data": {"capy": {"count": 4}, "cat": {"count": 1}}, "removed": ["bara"]}
+
+
+def test_snapshot_then_deltas_only_on_change():
+    # The polling thread stays blocked in load, states come from publish()
+    release = threading.Event()
+    broadcaster = Broadcaster("test", release.wait, interval=60)
+    subscriber = broadcaster.subscribe()
+    broadcaster.publish(state(capy=1))
+    broadcaster.publish(state(capy=1))
+    broadcaster.publish(state(capy=2))
+    assert parse(subscriber.events.get_nowait()) == ("snapshot", state(capy=1))
+    assert parse(subscriber.events.get_nowait()) == ("delta", {"count_voter": 2, "data": {"capy": {"count": 2}}})
+    assert subscriber.events.empty()
+    assert parse(broadcaster.subscribe().events.get_nowait()) == ("snapshot", state(capy=2))
+    release.set()
+
+
+def test_one_load_for_many_subscribers():
+    loads = []
+    loaded = threading.Event()
+
+    def load():
+        loads.append(1)
+        loaded.set()
+        return state(capy=1)
+
+    broadcaster = Broadcaster("test", load, interval=60, max_subscribers=5)
+    subscribers = [broadcaster.subscribe() for _ in range(5)]
+    assert loaded.wait(1)
+    for subscriber in subscribers:
+        assert parse(subscriber.events.get(timeout=1))[0] == "snapshot"
+    assert len(loads) == 1
+
+
+def test_stream_ends_and_unsubscribes():
+    broadcaster = Broadcaster("test", lambda: state(capy=1), interval=60)
+    subscriber = broadcaster.subscribe()
+    messages = list(broadcaster.stream(subscriber, keepalive=0.01, max_duration=0.05))
+    assert messages[0] == "retry: 60000\n\n"
+    assert any(message.startswith("event: snapshot") for message in messages)
+    assert subscriber not in broadcaster._subscribers
+
+
+def test_slow_subscriber_is_closed():
+    release = threading.Event()
+    broadcaster = Broadcaster("test", release.wait, interval=60)
+    subscriber = broadcaster.subscribe()
+    for count in range(subscriber.events.maxsize + 2):
+        broadcaster.publish(state(capy=count))
+    assert subscriber.closed
+    release.set()
+
+
+def test_subscribers_are_capped():
+    release = threading.Event()
+    broadcaster = Broadcaster("test", release.wait, interval=60, max_subscribers=2)
+    first = broadcaster.subscribe()
+    assert broadcaster.subscribe() is not None
+    assert broadcaster.subscribe() is None
+    broadcaster.unsubscribe(first)
+    assert broadcaster.subscribe() is not None
+    release.set()
+
+
+def test_no_subscribers_under_sync_workers():
+    broadcaster = Broadcaster("test", lambda: {"data": {}}, interval=60, max_subscribers=0)
+    assert broadcaster.subscribe() is None
+    assert broadcaster._pid is None
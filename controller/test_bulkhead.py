@@ -0,0 +1,64 @@
+import threading
+from types import SimpleNamespace
+
+import grpc
+import pytest
+from prometheus_client import REGISTRY
+
+from controller.bulkhead import Bulkhead, BulkheadInterceptor
+from controller.interceptors import OverloadedError
+
+
+class PendingCall:
+    def __init__(self):
+        self.callbacks = []
+
+    def add_done_callback(self, fn):
+        self.callbacks.append(fn)
+
+    def finish(self):
+        for fn in self.callbacks:
+            fn(self)
+
+
+def start(interceptor):
+    return interceptor.intercept_unary_unary(lambda details, request: PendingCall(), None, None)
+
+
+def test_full_bulkhead_rejects_at_once():
+    interceptor = BulkheadInterceptor(Bulkhead("test-full", limit=2))
+    calls = [start(interceptor) for _ in range(2)]
+    with pytest.raises(OverloadedError) as error:
+        start(interceptor)
+    assert error.value.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+    assert REGISTRY.get_sample_value("controller_bulkhead_rejected_total", {"service": "test-full"}) == 1
+    assert REGISTRY.get_sample_value("controller_bulkhead_active", {"service": "test-full"}) == 2
+    calls[0].finish()
+    start(interceptor)
+
+
+def test_queued_call_gets_released_slot():
+    bulkhead = Bulkhead("test-queue", limit=1, max_queue=1, queue_timeout=5)
+    interceptor = BulkheadInterceptor(bulkhead)
+    waiting = threading.Event()
+    gauge = bulkhead._queued
+    bulkhead._queued = SimpleNamespace(inc=lambda: gauge.inc() or waiting.set(), dec=gauge.dec)
+    first = start(interceptor)
+    queued = []
+    thread = threading.Thread(target=lambda: queued.append(start(interceptor)))
+    thread.start()
+    assert waiting.wait(1)
+    with pytest.raises(OverloadedError):
+        start(interceptor)
+    first.finish()
+    thread.join(1)
+    assert len(queued) == 1
+    assert bulkhead.active == 1 and bulkhead.queued == 0
+
+
+def test_queue_timeout_rejects():
+    bulkhead = Bulkhead("test-timeout", limit=1, max_queue=1, queue_timeout=0.01)
+    bulkhead.acquire()
+    with pytest.raises(OverloadedError):
+        bulkhead.acquire()
+    assert bulkhead.queued == 0
@@ -0,0 +1,124 @@
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from controller.cache import SingleFlight, TTLCache, UserCache
+
+
+def test_ttl_cache_hit_and_expiry():
+    cache = TTLCache(0.05)
+    calls = []
+    assert cache.get("key", lambda: calls.append(1) or "value") == "value"
+    assert cache.get("key", lambda: calls.append(1) or "other") == "value"
+    time.sleep(0.06)
+    assert cache.get("key", lambda: calls.append(1) or "other") == "other"
+    assert len(calls) == 2
+
+
+def test_ttl_cache_invalidate():
+    cache = TTLCache(60)
+    cache.get("key", lambda: "value")
+    cache.invalidate()
+    assert cache.get("key", lambda: "other") == "other"
+
+
+def test_ttl_cache_errors_are_not_cached():
+    cache = TTLCache(60)
+
+    def fail():
+        raise RuntimeError("backend down")
+
+    with pytest.raises(RuntimeError):
+        cache.get("key", fail)
+    assert cache.get("key", lambda: "value") == "value"
+
+
+def test_ttl_cache_bounded_lru_drops_expired_first():
+    cache = TTLCache(lambda value: value, max_entries=2)
+    with patch("controller.cache.time.monotonic", return_value=0):
+        cache.get("short", lambda: 1)
+        cache.get("long", lambda: 60)
+    with patch("controller.cache.time.monotonic", return_value=5):
+        cache.get("other", lambda: 60)
+        assert list(cache._entries) == ["long", "other"]
+        cache.get("long", lambda: 0)
+        cache.get("third", lambda: 60)
+        assert list(cache._entries) == ["long", "third"]
+
+
+def test_single_flight_shares_one_call():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return "value"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("key", slow))) for _ in range(5)]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ["value"] * 5
+    assert len(calls) == 1
+
+
+def test_user_cache_counts_hits_and_misses():
+    cache = UserCache(ttl=60, max_users=10, max_bytes=1024)
+    cache.get("uuid", "get_rp", lambda: "value")
+    cache.get("uuid", "get_rp", lambda: "other")
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_user_cache_evicts_least_recently_used_user():
+    cache = UserCache(ttl=60, max_users=2, max_bytes=1024)
+    cache.get("first", "get_rp", lambda: "1")
+    cache.get("second", "get_rp", lambda: "2")
+    cache.get("first", "get_rp", lambda: "unused")
+    cache.get("third", "get_rp", lambda: "3")
+    assert cache.stats()["evictions"] == 1
+    assert cache.get("first", "get_rp", lambda: "reloaded") == "1"
+    assert cache.get("second", "get_rp", lambda: "reloaded") == "reloaded"
+
+
+def test_user_cache_respects_byte_limit():
+    cache = UserCache(ttl=60, max_users=10, max_bytes=200)
+    cache.get("first", "get_rp", lambda: "x" * 100)
+    cache.get("second", "get_rp", lambda: "y" * 100)
+    assert cache.stats()["users"] == 1
+    assert cache.stats()["bytes"] <= 200
+
+
+def test_user_cache_invalidate_user_and_skip_uncacheable():
+    cache = UserCache(ttl=60, max_users=10, max_bytes=1024)
+    cache.get("uuid", "get_rp", lambda: "value")
+    cache.invalidate("uuid")
+    assert cache.get("uuid", "get_rp", lambda: "fresh", cacheable=lambda res: False) == "fresh"
+    assert cache.get("uuid", "get_rp", lambda: "again") == "again"
+
+
+def test_user_cache_invalidate_keeps_other_users_loads():
+    cache = UserCache(ttl=60, max_users=10, max_bytes=1024)
+
+    # Another request invalidates "second" while these loads are in flight
+    def load(value):
+        cache.invalidate("second")
+        return value
+
+    cache.get("first", "get_rp", lambda: load("first"))
+    cache.get("second", "get_rp", lambda: load("stale"))
+    assert cache.get("first", "get_rp", lambda: "reloaded") == "first"
+    assert cache.get("second", "get_rp", lambda: "fresh") == "fresh"
+    assert cache.get("second", "get_rp", lambda: "again") == "fresh"
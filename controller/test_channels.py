@@ -0,0 +1,98 @@
+from concurrent import futures
+from unittest.mock import MagicMock, patch
+
+import grpc
+import pytest
+from grpc_health.v1 import health, health_pb2, health_pb2_grpc
+
+from controller.channels import PooledStub, drain, in_flight
+
+
+class FakeStub:
+    def __init__(self, channel):
+        self.channel = channel
+        self.get_rp = MagicMock(return_value="response")
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+    servicer = health.HealthServicer()
+    health_pb2_grpc.add_HealthServicer_to_server(servicer, server)
+    port = server.add_insecure_port("127.0.0.1:0")
+    server.start()
+    monkeypatch.setenv("TEST_SERVICE_HOST", "127.0.0.1")
+    monkeypatch.setenv("TEST_SERVICE_PORT", str(port))
+    yield servicer
+    server.stop(None)
+
+
+def test_pool_opens_channels_on_first_use():
+    make_interceptors = MagicMock(return_value=[])
+    stub = PooledStub(FakeStub, "TEST", make_interceptors, size=3)
+    make_interceptors.assert_not_called()
+    assert stub.get_rp("request") == "response"
+    assert stub.get_rp("request") == "response"
+    make_interceptors.assert_called_once_with("TEST")
+
+
+def test_pool_round_robin():
+    stub = PooledStub(FakeStub, "TEST", lambda name: [], size=3)
+    channels = {id(stub._current().channel) for _ in range(6)}
+    assert len(channels) == 3
+
+
+def test_pool_reopens_after_fork():
+    make_interceptors = MagicMock(return_value=[])
+    stub = PooledStub(FakeStub, "TEST", make_interceptors, size=1)
+    with patch("controller.channels.os.getpid", return_value=1):
+        stub.get_rp("request")
+    with patch("controller.channels.os.getpid", return_value=2):
+        stub.get_rp("request")
+    assert make_interceptors.call_count == 2
+
+
+def test_pool_can_be_patched():
+    stub = PooledStub(FakeStub, "TEST", lambda name: [], size=1)
+    with patch.object(stub, "get_rp", return_value="patched"):
+        assert stub.get_rp("request") == "patched"
+    assert stub.get_rp("request") == "response"
+
+
+def test_health_check_skips_not_serving_channels(backend):
+    stub = PooledStub(FakeStub, "TEST", lambda name: [], size=2)
+    stub._current()
+    backend.set("", health_pb2.HealthCheckResponse.NOT_SERVING)
+    stub.check_health()
+    assert not any(slot.healthy for slot in stub._slots)
+    backend.set("", health_pb2.HealthCheckResponse.SERVING)
+    stub.check_health()
+    assert all(slot.healthy for slot in stub._slots)
+
+
+def test_health_check_replaces_channels_after_sustained_failure(monkeypatch):
+    monkeypatch.setenv("TEST_SERVICE_HOST", "127.0.0.1")
+    monkeypatch.setenv("TEST_SERVICE_PORT", "1")
+    monkeypatch.setattr("controller.channels.HEALTH_CHECK_REPLACE_AFTER", 2)
+    stub = PooledStub(FakeStub, "TEST", lambda name: [], size=1)
+    stub._current()
+    broken = stub._slots[0]
+    stub.check_health()
+    assert stub._slots[0] is broken
+    assert not broken.healthy
+    # A call still running on the old channel keeps it open until it ends
+    broken.calls.count = 1
+    stub.check_health()
+    assert stub._slots[0] is not broken
+    assert stub._retired == [broken]
+    broken.calls.count = 0
+    stub.check_health()
+    assert stub._retired == []
+
+
+def test_drain_closes_channels_when_idle():
+    stub = PooledStub(FakeStub, "TEST", lambda name: [], size=1)
+    stub.get_rp("request")
+    assert in_flight.count == 0
+    drain(0.1)
+    assert stub._slots == []
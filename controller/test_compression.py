@@ -0,0 +1,56 @@
+import gzip
+
+import pytest
+from flask import Flask
+
+from controller.compression import (COMPRESS_MIN_SIZE, compressed_cache,
+                                    init_compression)
+from controller.http_cache import conditional
+
+BODY = {"data": ["capybara"] * COMPRESS_MIN_SIZE}
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    init_compression(app)
+    compressed_cache.clear()
+
+    @app.get("/big")
+    @conditional("public, no-cache")
+    def big():
+        return BODY
+
+    @app.get("/small")
+    def small():
+        return {"data": "capybara"}
+
+    return app.test_client()
+
+
+def test_gzip_negotiated(client):
+    response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert response.headers["ETag"].endswith('-gzip"')
+    assert gzip.decompress(response.data).startswith(b'{"data":["capybara"')
+
+
+def test_identity_and_small_responses_not_compressed(client):
+    assert "Content-Encoding" not in client.get("/big").headers
+    assert "Content-Encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+
+
+def test_compressed_body_reused(client):
+    first = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    size = compressed_cache.size
+    second = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert first.data == second.data
+    assert compressed_cache.size == size == len(first.data)
+
+
+def test_encoded_etag_revalidates(client):
+    etag = client.get("/big", headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+    response = client.get("/big", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
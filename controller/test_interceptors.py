@@ -0,0 +1,145 @@
+import threading
+import time
+from collections import namedtuple
+
+import grpc
+import pytest
+from google.protobuf import wrappers_pb2
+
+from controller.interceptors import (CircuitBreakerInterceptor,
+                                     CircuitOpenError, CoalescingInterceptor,
+                                     DeadlineInterceptor, RetryBudget,
+                                     RetryInterceptor)
+
+CallDetails = namedtuple("CallDetails", ["method", "timeout", "metadata", "credentials",
+                                         "wait_for_ready", "compression"])
+
+
+def details(method):
+    return CallDetails(method, None, None, None, None, None)
+
+
+def slow_continuation(calls, release):
+    def continuation(client_call_details, request):
+        calls.append(request.value)
+        release.wait()
+        return request.value.upper()
+    return continuation
+
+
+def test_coalescing_shares_identical_calls():
+    interceptor = CoalescingInterceptor({"get_peer_info"})
+    calls, release, results = [], threading.Event(), []
+    continuation = slow_continuation(calls, release)
+
+    def call():
+        results.append(interceptor.intercept_unary_unary(
+            continuation, details("/user.UserService/get_peer_info"), wrappers_pb2.StringValue(value="capy")))
+
+    threads = [threading.Thread(target=call) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ["CAPY"] * 5
+    assert calls == ["capy"]
+
+
+def test_coalescing_skips_other_methods():
+    interceptor = CoalescingInterceptor({"get_peer_info"})
+    calls, release = [], threading.Event()
+    release.set()
+    continuation = slow_continuation(calls, release)
+    for _ in range(2):
+        interceptor.intercept_unary_unary(
+            continuation, details("/user.UserService/add_friend"), wrappers_pb2.StringValue(value="capy"))
+    assert calls == ["capy", "capy"]
+
+
+class FakeCall:
+    def __init__(self, code):
+        self._code = code
+
+    def code(self):
+        return self._code
+
+    def done(self):
+        return True
+
+    def add_done_callback(self, fn):
+        fn(self)
+
+
+def replies(*codes):
+    calls = []
+
+    def continuation(client_call_details, request):
+        calls.append(client_call_details)
+        return FakeCall(codes[min(len(calls), len(codes)) - 1])
+    return continuation, calls
+
+
+def test_deadline_only_fills_missing_timeout():
+    interceptor = DeadlineInterceptor(3, {"Put": 30})
+    continuation, calls = replies(grpc.StatusCode.OK)
+    interceptor.intercept_unary_unary(continuation, details("/user.UserService/get_rp"), None)
+    interceptor.intercept_stream_unary(continuation, details("/storage.StorageService/Put"), iter([]))
+    interceptor.intercept_unary_unary(continuation, details("/user.UserService/get_rp")._replace(timeout=1), None)
+    assert [call.timeout for call in calls] == [3, 30, 1]
+
+
+def test_retry_idempotent_method_until_success():
+    interceptor = RetryInterceptor({"get_rp"}, RetryBudget(ratio=0.1, max_tokens=10), backoff=0)
+    continuation, calls = replies(grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.OK)
+    call = interceptor.intercept_unary_unary(continuation, details("/user.UserService/get_rp"), None)
+    assert call.code() == grpc.StatusCode.OK
+    assert len(calls) == 2
+
+
+def test_retry_skips_mutations_and_respects_budget():
+    interceptor = RetryInterceptor({"get_rp"}, RetryBudget(ratio=0, max_tokens=1), backoff=0)
+    continuation, calls = replies(grpc.StatusCode.UNAVAILABLE)
+    interceptor.intercept_unary_unary(continuation, details("/user.UserService/add_friend"), None)
+    assert len(calls) == 1
+    interceptor.intercept_unary_unary(continuation, details("/user.UserService/get_rp"), None)
+    interceptor.intercept_unary_unary(continuation, details("/user.UserService/get_rp"), None)
+    assert len(calls) == 4
+
+
+def test_retry_shares_the_call_timeout():
+    interceptor = RetryInterceptor({"get_rp"}, RetryBudget(ratio=0.1, max_tokens=10), backoff=0)
+    continuation, calls = replies(grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.OK)
+    interceptor.intercept_unary_unary(continuation, details("/user.UserService/get_rp")._replace(timeout=1), None)
+    assert calls[0].timeout == 1
+    assert 0 < calls[1].timeout < 1
+    continuation, calls = replies(grpc.StatusCode.UNAVAILABLE)
+    interceptor.intercept_unary_unary(continuation, details("/user.UserService/get_rp")._replace(timeout=0), None)
+    assert len(calls) == 1
+
+
+def test_circuit_breaker_opens_and_recovers():
+    breaker = CircuitBreakerInterceptor("user", threshold=2, reset_timeout=0.05)
+    failing, _ = replies(grpc.StatusCode.UNAVAILABLE)
+    for _ in range(2):
+        breaker.intercept_unary_unary(failing, details("/user.UserService/get_rp"), None)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.intercept_unary_unary(failing, details("/user.UserService/get_rp"), None)
+    time.sleep(0.06)
+    assert breaker.state == "half-open"
+    healthy, calls = replies(grpc.StatusCode.OK)
+    breaker.intercept_unary_unary(healthy, details("/user.UserService/get_rp"), None)
+    assert breaker.state == "closed"
+    assert len(calls) == 1
+
+
+def test_circuit_breaker_ignores_cancelled_calls():
+    breaker = CircuitBreakerInterceptor("user", threshold=2, reset_timeout=60)
+    failing, _ = replies(grpc.StatusCode.UNAVAILABLE)
+    cancelled, _ = replies(grpc.StatusCode.CANCELLED)
+    breaker.intercept_unary_unary(failing, details("/user.UserService/get_rp"), None)
+    breaker.intercept_unary_unary(cancelled, details("/user.UserService/get_rp"), None)
+    breaker.intercept_unary_unary(failing, details("/user.UserService/get_rp"), None)
+    assert breaker.state == "open"
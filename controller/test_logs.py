@@ -0,0 +1,61 @@
+import io
+import json
+import logging
+
+import pytest
+from flask import Flask
+
+from controller.logs import (ContextFilter, configure_logging, init_logging,
+                             request_id)
+
+
+@pytest.fixture
+def output():
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    stream = io.StringIO()
+    handler = configure_logging(level="INFO", stream=stream)
+    yield stream, handler
+    handler.close()
+    root.handlers[:] = handlers
+    root.setLevel(level)
+
+
+def records(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_json_records_carry_request_id(output):
+    stream, handler = output
+    token = request_id.set("abc")
+    logging.getLogger("controller.test").info("user %s", "capy")
+    request_id.reset(token)
+    logging.debug("dropped by level")
+    handler.close()
+    [record] = records(stream)
+    assert record["message"] == "user capy"
+    assert record["level"] == "INFO"
+    assert record["logger"] == "controller.test"
+    assert record["request_id"] == "abc"
+
+
+def test_info_sampling_keeps_warnings():
+    sampler = ContextFilter(info_rate=0)
+    info = logging.LogRecord("test", logging.INFO, __file__, 1, "info", None, None)
+    warning = logging.LogRecord("test", logging.WARNING, __file__, 1, "warning", None, None)
+    assert not sampler.filter(info)
+    assert sampler.filter(warning)
+
+
+def test_request_id_header(output):
+    app = Flask(__name__)
+    init_logging(app)
+
+    @app.get("/")
+    def index():
+        return {"request_id": request_id.get()}
+
+    client = app.test_client()
+    response = client.get("/", headers={"X-Request-ID": "req-1"})
+    assert response.headers["X-Request-ID"] == "req-1" == response.json["request_id"]
+    assert len(client.get("/").headers["X-Request-ID"]) == 32
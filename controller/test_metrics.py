@@ -0,0 +1,16 @@
+from prometheus_client import REGISTRY
+
+from controller.cache import UserCache
+from controller.metrics import CacheMetrics
+
+
+def test_cache_metrics_follow_stats():
+    cache = UserCache(ttl=60, max_users=10, max_bytes=1024)
+    cache_metrics = CacheMetrics("test_cache", cache)
+    cache.get("uuid", "get_rp", lambda: "value")
+    cache.get("uuid", "get_rp", lambda: "value")
+    cache_metrics.sync()
+    cache_metrics.sync()
+    assert REGISTRY.get_sample_value("controller_test_cache_hits_total") == 1
+    assert REGISTRY.get_sample_value("controller_test_cache_misses_total") == 1
+    assert REGISTRY.get_sample_value("controller_test_cache_users") == 1
@@ -0,0 +1,59 @@
+from unittest.mock import patch
+
+from flask import Flask
+
+from controller import ratelimit
+from controller.ratelimit import MemoryStore, body_key, rate_limit
+
+
+def test_bucket_allows_burst_then_refills():
+    store = MemoryStore(max_keys=10)
+    with patch("controller.ratelimit.time.monotonic", return_value=0):
+        assert [store.take("a", rate=1, burst=2) for _ in range(3)] == [0, 0, 1]
+        assert store.take("b", rate=1, burst=2) == 0
+    with patch("controller.ratelimit.time.monotonic", return_value=1):
+        assert store.take("a", rate=1, burst=2) == 0
+
+
+def test_store_stays_bounded():
+    store = MemoryStore(max_keys=2)
+    for key in "abcad":
+        store.take(key, rate=0.001, burst=5)
+    assert list(store._buckets) == ["a", "d"]
+
+
+def test_rate_limited_view():
+    app = Flask(__name__)
+
+    @app.post("/vote")
+    @rate_limit("vote", rate=0.001, burst=1)
+    def vote():
+        return {"status": 0}
+
+    client = app.test_client()
+    with patch.object(ratelimit, "store", MemoryStore(max_keys=10)):
+        assert client.post("/vote").status_code == 200
+        response = client.post("/vote")
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) > 0
+        # A made-up session cookie doesn't get a fresh bucket
+        client.set_cookie("tmp-uuid", "other")
+        assert client.post("/vote").status_code == 429
+
+
+def test_login_limited_per_address_and_username():
+    app = Flask(__name__)
+
+    @app.post("/login")
+    @rate_limit("login", rate=0.001, burst=1, key=body_key("username"))
+    def login():
+        return {"status": 0}
+
+    client = app.test_client()
+    with patch.object(ratelimit, "store", MemoryStore(max_keys=10)):
+        assert client.post("/login", json={"username": "capy"}).status_code == 200
+        assert client.post("/login", json={"username": "capy"}).status_code == 429
+        assert client.post("/login", json={"username": "bara"}).status_code == 200
+        assert client.post("/login", json={"username": "capy"}, environ_base={"REMOTE_ADDR": "10.0.0.2"}).status_code == 200
+        assert client.post("/login", json=["capy"]).status_code == 200
+        assert client.post("/login", json=["capy"]).status_code == 429
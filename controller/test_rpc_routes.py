@@ -0,0 +1,60 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+from flask import Blueprint, Flask
+
+from controller.rpc_routes import RpcRoute, register_routes
+from controller.serialization import MessageFields
+
+STATUS = MessageFields(status="status", description="description")
+
+
+@pytest.fixture
+def setup():
+    stub = MagicMock()
+    stub.VoteTmp.return_value = SimpleNamespace(status=0, description="OK")
+    stub.VoteCapy.return_value = SimpleNamespace(status=3, description="Already voted")
+    invalidate = MagicMock()
+    api = Blueprint("api", __name__, url_prefix="/api")
+    register_routes(api, stub, [
+        RpcRoute("/vote", "Vote{kind}", SimpleNamespace, STATUS, methods=["POST"], uuid_field="uuid",
+                 body={"candidate_id": "id"}, unauthorized={"status": 1}, missing={"status": 2},
+                 on_success=[invalidate]),
+    ])
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    return app.test_client(), stub, invalidate
+
+
+def test_tmp_caller(setup):
+    client, stub, invalidate = setup
+    client.set_cookie("tmp-uuid", "tmp")
+    assert client.post("/api/vote", json={"id": 7}).json == {"status": 0, "description": "OK"}
+    stub.VoteTmp.assert_called_once_with(SimpleNamespace(uuid="tmp", candidate_id=7))
+    invalidate.assert_called_once_with()
+
+
+def test_capy_caller_without_success_hooks(setup):
+    client, stub, invalidate = setup
+    client.set_cookie("capy-uuid", "capy")
+    assert client.post("/api/vote", json={"id": 7}).json["status"] == 3
+    stub.VoteCapy.assert_called_once()
+    invalidate.assert_not_called()
+
+
+def test_unauthorized_and_missing(setup):
+    client, stub, _ = setup
+    assert client.post("/api/vote", json={"id": 7}).json == {"status": 1}
+    client.set_cookie("capy-uuid", "capy")
+    assert client.post("/api/vote", json={}).json == {"status": 2}
+    assert client.post("/api/vote", json=[7]).json == {"status": 2}
+    assert client.post("/api/vote", data="not json").json == {"status": 2}
+    assert not stub.method_calls
+
+
+def test_incomplete_route_fails_at_startup():
+    with pytest.raises(ValueError):
+        RpcRoute("/vote", "Vote{kind}", SimpleNamespace, STATUS, body={"candidate_id": "id"})
+    with pytest.raises(ValueError):
+        RpcRoute("/my_voice", "MyCandidates{kind}", SimpleNamespace, STATUS, uuid_field="uuid")
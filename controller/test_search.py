@@ -0,0 +1,133 @@
+import threading
+from concurrent.futures import CancelledError, Future
+from unittest.mock import patch
+
+from controller.search import PendingSearch, SearchCache
+
+
+def answer(*nicknames, status=0):
+    future = Future()
+    future.set_result((status, "OK", {"friends": [], "on_platform": [{"nickname": n} for n in nicknames],
+                                      "out_platform": []}))
+    return future
+
+
+def nicknames(result):
+    return [user["nickname"] for user in result[2]["on_platform"]]
+
+
+def test_longer_query_filters_cached_result():
+    cache = SearchCache(ttl=10, max_users=10)
+    fetched = []
+
+    def fetch(nickname):
+        fetched.append(nickname)
+        return answer("capybara", "Capy", "cat")
+
+    assert nicknames(cache.search("u", "Ca", fetch)) == ["capybara", "Capy", "cat"]
+    assert nicknames(cache.search("u", "cap", fetch)) == ["capybara", "Capy"]
+    assert fetched == ["Ca"]
+    assert cache.stats()["hits"] == 1
+
+
+def test_other_users_and_errors_are_not_shared():
+    cache = SearchCache(ttl=10, max_users=10)
+    fetched = []
+
+    def fetch(nickname):
+        fetched.append(nickname)
+        return answer(status=1 if len(fetched) == 1 else 0)
+
+    cache.search("u", "ca", fetch)
+    cache.search("u", "ca", fetch)
+    cache.search("v", "ca", fetch)
+    assert len(fetched) == 3
+
+
+def test_capped_result_is_not_narrowed():
+    cache = SearchCache(ttl=10, max_users=10, result_limit=2)
+    fetched = []
+
+    def fetch(nickname):
+        fetched.append(nickname)
+        return answer("capy", "cat")
+
+    cache.search("u", "ca", fetch)
+    cache.search("u", "cap", fetch)
+    assert fetched == ["ca", "cap"]
+
+
+def test_entries_expire_and_invalidate():
+    cache = SearchCache(ttl=10, max_users=10)
+    fetched = []
+
+    def fetch(nickname):
+        fetched.append(nickname)
+        return answer("capy")
+
+    with patch("controller.search.time.monotonic", return_value=0):
+        cache.search("u", "ca", fetch)
+    with patch("controller.search.time.monotonic", return_value=20):
+        cache.search("u", "ca", fetch)
+    cache.invalidate("u")
+    cache.search("u", "ca", fetch)
+    assert len(fetched) == 3
+
+
+def test_newer_query_cancels_stale_search():
+    cache = SearchCache(ttl=10, max_users=10)
+    stale = Future()
+    started = threading.Event()
+    results = []
+
+    def fetch_stale(nickname):
+        started.set()
+        return stale
+
+    def first():
+        try:
+            cache.search("u", "c", fetch_stale)
+        except CancelledError:
+            results.append("cancelled")
+
+    thread = threading.Thread(target=first)
+    thread.start()
+    assert started.wait(1)
+    cache.search("u", "ca", lambda nickname: answer("capy"))
+    thread.join(1)
+    assert results == ["cancelled"]
+
+
+def test_search_cancelled_before_its_call_starts():
+    pending = PendingSearch()
+    pending.cancel()
+    future = Future()
+    pending.start(future)
+    assert future.cancelled()
+
+
+def test_fetch_runs_outside_the_lock():
+    cache = SearchCache(ttl=10, max_users=10)
+
+    def fetch(nickname):
+        assert not cache._lock.locked()
+        return answer("capy")
+
+    assert cache.search("u", "ca", fetch)[0] == 0
+
+
+def test_queries_per_user_are_capped():
+    cache = SearchCache(ttl=10, max_users=10, max_queries=2)
+    for query in ("a", "b", "c"):
+        cache.search("u", query, lambda nickname: answer(nickname))
+    assert list(cache._users["u"]) == ["b", "c"]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_expired_queries_are_dropped_on_store():
+    cache = SearchCache(ttl=10, max_users=10)
+    with patch("controller.search.time.monotonic", return_value=0):
+        cache.search("u", "a", lambda nickname: answer(nickname))
+    with patch("controller.search.time.monotonic", return_value=20):
+        cache.search("u", "b", lambda nickname: answer(nickname))
+    assert list(cache._users["u"]) == ["b"]
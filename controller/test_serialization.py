@@ -0,0 +1,44 @@
+import datetime
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+
+from controller.serialization import MessageFields, OrjsonProvider, init_json
+
+
+def test_message_fields():
+    fields = MessageFields(nickname="login", avatar="avatar")
+    users = [SimpleNamespace(login="capy", avatar="a.webp", extra=1), SimpleNamespace(login="bara", avatar="")]
+    assert fields(users[0]) == {"nickname": "capy", "avatar": "a.webp"}
+    assert fields.many(users) == [{"nickname": "capy", "avatar": "a.webp"}, {"nickname": "bara", "avatar": ""}]
+    assert MessageFields(id="id").many([SimpleNamespace(id=1)]) == [{"id": 1}]
+
+
+def test_message_fields_nested():
+    fields = MessageFields(count="count", data=("users", MessageFields(nickname="login")))
+    message = SimpleNamespace(count=1, users=[SimpleNamespace(login="capy")])
+    assert fields(message) == {"count": 1, "data": [{"nickname": "capy"}]}
+    assert fields.many([message]) == [{"count": 1, "data": [{"nickname": "capy"}]}]
+
+
+@pytest.fixture
+def app():
+    pytest.importorskip("orjson")
+    app = Flask(__name__)
+    init_json(app)
+
+    @app.get("/")
+    def index():
+        return {"description": "Привет", "date": datetime.date(2024, 1, 1), "data": [1, 2]}
+
+    return app
+
+
+def test_orjson_provider_matches_stdlib(app):
+    assert isinstance(app.json, OrjsonProvider)
+    response = app.test_client().get("/")
+    assert response.mimetype == "application/json"
+    assert response.data.endswith(b"\n")
+    assert response.json == {"description": "Привет", "date": "Mon, 01 Jan 2024 00:00:00 GMT", "data": [1, 2]}
+    assert app.json.loads(app.json.dumps({"a": 1})) == {"a": 1}
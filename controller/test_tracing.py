@@ -0,0 +1,70 @@
+import grpc
+from flask import Flask
+
+from controller import tracing
+from controller.interceptors import ClientCallDetails
+from controller.tracing import (MemoryExporter, Tracer, TracingInterceptor,
+                                current_span)
+
+
+class Outcome:
+    def __init__(self, code=grpc.StatusCode.OK):
+        self._code = code
+
+    def code(self):
+        return self._code
+
+    def add_done_callback(self, fn):
+        fn(self)
+
+
+def details(method="/user.UserService/get_rp"):
+    return ClientCallDetails(method, None, None, None, None, None)
+
+
+def test_untraced_call_passes_through():
+    tracer = Tracer(MemoryExporter(10))
+    sent = []
+    TracingInterceptor("user", tracer).intercept_unary_unary(
+        lambda d, r: sent.append(d) or Outcome(), details(), "request")
+    assert sent[0].metadata is None
+    assert not tracer.exporter.spans
+
+
+def test_client_span_is_child_and_propagated():
+    tracer = Tracer(MemoryExporter(10))
+    parent = tracer.start_span("GET /api/get_user_data", "server")
+    token = current_span.set(parent)
+    sent = []
+    TracingInterceptor("user", tracer).intercept_unary_unary(
+        lambda d, r: sent.append(d) or Outcome(grpc.StatusCode.UNAVAILABLE), details(), "request")
+    current_span.reset(token)
+    [span] = tracer.exporter.spans
+    assert span.name == "user/get_rp"
+    assert span.parent_id == parent.span_id and span.trace_id == parent.trace_id
+    assert span.status == "ERROR"
+    assert dict(sent[0].metadata)["traceparent"] == span.traceparent
+
+
+def test_incoming_traceparent():
+    tracer = Tracer(MemoryExporter(10), sample_rate=0)
+    trace_id, parent_id = "4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7"
+    span = tracer.start_span("GET /", "server", traceparent=f"00-{trace_id}-{parent_id}-01")
+    assert (span.trace_id, span.parent_id) == (trace_id, parent_id)
+    assert tracer.start_span("GET /", "server", traceparent=f"00-{trace_id}-{parent_id}-00") is None
+    assert tracer.start_span("GET /", "server") is None
+
+
+def test_request_span(monkeypatch):
+    monkeypatch.setattr(tracing, "tracer", Tracer(MemoryExporter(10)))
+    app = Flask(__name__)
+    tracing.init_tracing(app)
+
+    @app.get("/items/<int:item>")
+    def item(item):
+        return {"span": current_span.get().name}
+
+    assert app.test_client().get("/items/1").json == {"span": "GET /items/<int:item>"}
+    [span] = tracing.tracer.exporter.spans
+    assert span.attributes["http.status_code"] == 200
+    assert span.duration is not None
@@ -0,0 +1,208 @@
+import contextvars
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+
+import grpc
+from flask import g, request
+
+from controller.interceptors import method_name, with_details
+
+# "memory", "file" (TRACE_FILE) or empty to turn tracing off
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "")
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_MEMORY_SPANS = int(os.getenv("TRACE_MEMORY_SPANS", 10000))
+# Share of new traces that are recorded, a sampled parent always is
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 1))
+
+# W3C trace context: version-trace_id-parent_id-flags
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    def __init__(self, tracer, name, kind, trace_id, parent_id=None, attributes=None):
+        self.tracer = tracer
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.attributes = attributes or {}
+        self.status = "OK"
+        self.start = time.time_ns()
+        self._started = time.perf_counter()
+        self.duration = None
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def end(self):
+        if self.duration is None:
+            self.duration = time.perf_counter() - self._started
+            self.tracer.exporter.export(self)
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class MemoryExporter:
+    """Keeps the last ``max_spans`` finished spans, for tests and local use."""
+
+    def __init__(self, max_spans):
+        self.spans = deque(maxlen=max_spans)
+
+    def export(self, span):
+        self.spans.append(span)
+
+    def traces(self):
+        traces = {}
+        for span in list(self.spans):
+            traces.setdefault(span.trace_id, []).append(span.to_dict())
+        return traces
+
+
+class FileExporter:
+    """Appends finished spans to ``path``, one JSON object per line."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False) + "\n"
+        with self._lock, open(self.path, "a") as file:
+            file.write(line)
+
+
+EXPORTERS = {
+    "memory": lambda: MemoryExporter(TRACE_MEMORY_SPANS),
+    "file": lambda: FileExporter(TRACE_FILE),
+}
+
+
+class Tracer:
+    """Starts spans and hands the finished ones to ``exporter``. Without an
+    exporter nothing is recorded. Any object with ``export(span)`` will do."""
+
+    def __init__(self, exporter=None, sample_rate=1):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    def start_span(self, name, kind, parent=None, traceparent=None, attributes=None):
+        if self.exporter is None:
+            return None
+        if parent is not None:
+            return Span(self, name, kind, parent.trace_id, parent.span_id, attributes)
+        match = TRACEPARENT.match(traceparent or "")
+        if match:
+            trace_id, parent_id, flags = match.groups()
+            if not int(flags, 16) & 1:
+                return None
+            return Span(self, name, kind, trace_id, parent_id, attributes)
+        if random.random() >= self.sample_rate:
+            return None
+        return Span(self, name, kind, f"{random.getrandbits(128):032x}", attributes=attributes)
+
+
+tracer = Tracer(EXPORTERS[TRACE_EXPORTER]() if TRACE_EXPORTER else None, TRACE_SAMPLE_RATE)
+
+
+class TracingInterceptor(grpc.UnaryUnaryClientInterceptor, grpc.StreamUnaryClientInterceptor):
+    """One client span per stub call made inside a traced request, with the
+    span's trace context sent to the backend as ``traceparent`` metadata."""
+
+    def __init__(self, service, tracer=tracer):
+        self.service = service
+        self.tracer = tracer
+
+    def _trace(self, client_call_details, invoke):
+        parent = current_span.get()
+        if parent is None:
+            return invoke(client_call_details)
+        method = method_name(client_call_details)
+        span = self.tracer.start_span(f"{self.service}/{method}", "client", parent=parent,
+                                      attributes={"rpc.service": self.service, "rpc.method": method})
+        if span is None:
+            return invoke(client_call_details)
+        metadata = list(client_call_details.metadata or []) + [("traceparent", span.traceparent)]
+
+        def done(call):
+            code = call.code()
+            span.attributes["rpc.grpc.status_code"] = code.name if code else "UNKNOWN"
+            if code != grpc.StatusCode.OK:
+                span.status = "ERROR"
+            span.end()
+
+        try:
+            call = invoke(with_details(client_call_details, metadata=metadata))
+        except Exception:
+            span.status = "ERROR"
+            span.end()
+            raise
+        call.add_done_callback(done)
+        return call
+
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        return self._trace(client_call_details, lambda details: continuation(details, request))
+
+    def intercept_stream_unary(self, continuation, client_call_details, request_iterator):
+        return self._trace(client_call_details, lambda details: continuation(details, request_iterator))
+
+
+def start_request_span():
+    rule = request.url_rule.rule if request.url_rule else request.path
+    span = tracer.start_span(f"{request.method} {rule}", "server", traceparent=request.headers.get("traceparent"),
+                             attributes={"http.method": request.method, "http.route": rule})
+    if span is not None:
+        g.trace_token = current_span.set(span)
+
+
+def record_status(response):
+    span = current_span.get()
+    if span is not None:
+        span.attributes["http.status_code"] = response.status_code
+        if response.status_code >= 500:
+            span.status = "ERROR"
+    return response
+
+
+def end_request_span(exc):
+    token = g.pop("trace_token", None)
+    if token is not None:
+        span = current_span.get()
+        if exc is not None:
+            span.status = "ERROR"
+        span.end()
+        current_span.reset(token)
+
+
+def traces():
+    return tracer.exporter.traces()
+
+
+def init_tracing(app):
+    if tracer.exporter is None:
+        return
+    app.before_request(start_request_span)
+    app.after_request(record_status)
+    app.teardown_request(end_request_span)
+    # Local use only: the in-memory exporter's spans grouped by trace
+    if isinstance(tracer.exporter, MemoryExporter):
+        app.add_url_rule("/traces", "traces", traces)
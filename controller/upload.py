@@ -0,0 +1,63 @@
+import os
+
+from werkzeug.sansio.multipart import (Data, Epilogue, Field, File,
+                                       MultipartDecoder, NeedData)
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 64 * 1024))
+UPLOAD_MAX_CHUNK_SIZE = int(os.getenv("UPLOAD_MAX_CHUNK_SIZE", 1024 * 1024))
+
+
+class UploadStream:
+    """Reads one file field of a multipart body straight from the WSGI input,
+    so the upload is forwarded while it arrives instead of being spooled by
+    Werkzeug first."""
+
+    def __init__(self, stream, boundary, field, read_size=UPLOAD_CHUNK_SIZE):
+        self.stream = stream
+        self.field = field
+        self.read_size = read_size
+        self.filename = None
+        self._decoder = MultipartDecoder(boundary.encode(), max_parts=16)
+        self._events = self._read_events()
+
+    def _read_events(self):
+        while True:
+            event = self._decoder.next_event()
+            if isinstance(event, NeedData):
+                self._decoder.receive_data(self.stream.read(self.read_size) or None)
+            elif isinstance(event, Epilogue):
+                return
+            else:
+                yield event
+
+    # Skips everything before the file part, returns its filename or None
+    def open(self):
+        for event in self._events:
+            if isinstance(event, File) and event.name == self.field:
+                self.filename = event.filename
+                return self.filename
+        return None
+
+    def _data(self):
+        for event in self._events:
+            if isinstance(event, (Field, File)):
+                return
+            if isinstance(event, Data):
+                if event.data:
+                    yield event.data
+                if not event.more_data:
+                    return
+
+    # Regroups the body into pieces that start at min_size and double up to
+    # max_size, so small avatars stay one message and big ones take few
+    def chunks(self, min_size=UPLOAD_CHUNK_SIZE, max_size=UPLOAD_MAX_CHUNK_SIZE):
+        size = min_size
+        buffer = bytearray()
+        for data in self._data():
+            buffer += data
+            while len(buffer) >= size:
+                yield bytes(buffer[:size])
+                del buffer[:size]
+                size = min(size * 2, max_size)
+        if buffer:
+            yield bytes(buffer)
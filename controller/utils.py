@@ -1,3 +1,16 @@
+import contextvars
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import grpc
+
+FAN_OUT_WORKERS = int(os.getenv("FAN_OUT_WORKERS", 32))
+executor = ThreadPoolExecutor(max_workers=FAN_OUT_WORKERS,
+                              thread_name_prefix="fan-out")
+
+
 def generate_response(status="Success", status_code=0, description="Success", data=None):
     if data is None:
         data = dict()
@@ -7,3 +20,42 @@ def generate_response(status="Success", status_code=0, description="Success", da
         "description": description,
         "data": data
     }
+
+
+# Runs fn in the pool with the caller's context (request ID and other contextvars)
+def submit(fn, *args):
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+# Starts every (function, *args) call at once; futures come back in call order
+def fan_out(*calls):
+    return [submit(*call) for call in calls]
+
+
+# Like fan_out for one function over many items, but with at most `limit`
+# calls running at once so one request can't take over the whole pool
+def fan_out_bounded(fn, items, limit):
+    slots = threading.BoundedSemaphore(limit)
+    futures = []
+    for item in items:
+        slots.acquire()
+        future = submit(fn, item)
+        future.add_done_callback(lambda _: slots.release())
+        futures.append(future)
+    return futures
+
+
+# Backend failures that reach a view (deadline, open circuit, unavailable)
+# become a JSON error instead of an HTML 500
+def backend_error(error):
+    code = error.code() if isinstance(error, grpc.Call) else None
+    logging.warning("[ | API | BACKEND ] - gRPC call failed: %s", code)
+    if code == grpc.StatusCode.RESOURCE_EXHAUSTED:
+        return too_many_requests(), 429
+    http_status = {grpc.StatusCode.DEADLINE_EXCEEDED: 504,
+                   grpc.StatusCode.UNAVAILABLE: 503}.get(code, 502)
+    return generate_response(status="FAIL", status_code=1, description="Сервис временно недоступен"), http_status
+
+
+def too_many_requests():
+    return generate_response(status="FAIL", status_code=1, description="Слишком много запросов, попробуйте позже")
@@ -0,0 +1,44 @@
+import multiprocessing
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:3065")
+
+# gthread keeps one process per core and lets threads wait on backends,
+# sync is the classic one-request-per-process model, gevent multiplexes
+# many requests on greenlets in a single process
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+cpus = multiprocessing.cpu_count()
+workers = int(os.getenv("GUNICORN_WORKERS", cpus * 2 + 1 if worker_class == "sync" else cpus))
+threads = int(os.getenv("GUNICORN_THREADS", 8 if worker_class == "gthread" else 1))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 1000))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 20))
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 0))
+
+# The app is imported once in the master and shared copy-on-write, gRPC
+# channels are still opened per worker (controller/channels.py). gevent
+# patches the stdlib only after fork, so it has to load the app itself.
+preload_app = os.getenv("GUNICORN_PRELOAD", "1" if worker_class != "gevent" else "0") == "1"
+
+
+def post_worker_init(worker):
+    if worker_class == "gevent":
+        from grpc.experimental import gevent as grpc_gevent
+        grpc_gevent.init_gevent()
+
+
+def worker_exit(server, worker):
+    from controller.channels import drain
+    drain(graceful_timeout)
+
+
+def child_exit(server, worker):
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -6,4 +6,5 @@ from controller import app
 
 if __name__ == "__main__":
     load_dotenv()
-    app.run(host='0.0.0.0', port=os.getenv("PORT"), debug=os.getenv("DEBUG"))
+    # Development server only, production runs gunicorn with gunicorn.conf.py
+    app.run(host='0.0.0.0', port=os.getenv("PORT"), debug=os.getenv("DEBUG", "").lower() in ("1", "true"))
@@ -1 +1 @@
-gunicorn -b 0.0.0.0:3065 -w 4 main:app
\ No newline at end of file
+gunicorn -c gunicorn.conf.py main:app